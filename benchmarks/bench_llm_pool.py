@@ -0,0 +1,97 @@
+"""聊天插件并发吞吐基准: 每次新建同步 OpenAI 客户端 vs 共享的异步客户端池
+
+在本地启动一个模拟 OpenAI 接口的 aiohttp 服务(每个请求固定延迟)，
+分别以旧方式(每次请求新建 OpenAI 客户端并在事件循环中阻塞调用)和 llm_pool 并发发送请求。
+
+运行: python -m benchmarks.bench_llm_pool
+"""
+
+import asyncio
+import threading
+import time
+from typing import Tuple
+
+from aiohttp import web
+from openai import OpenAI
+
+from pero.utils.llm import LLMClientPool
+
+HOST, PORT = "127.0.0.1", 18765
+BASE_URL = f"http://{HOST}:{PORT}/v1"
+LATENCY = 0.05
+REQUESTS = 64
+CONCURRENCY = 16
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "mock",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "你好"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+MESSAGES = [{"role": "system", "content": "你是 pero"}, {"role": "user", "content": "你好"}]
+
+
+async def completions(request: web.Request) -> web.Response:
+    await request.read()
+    await asyncio.sleep(LATENCY)
+    return web.json_response(COMPLETION)
+
+
+def serve_in_thread() -> Tuple[asyncio.AbstractEventLoop, web.AppRunner]:
+    """在独立线程的事件循环中运行模拟服务，旧方式的阻塞调用不会卡住服务端"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+
+    async def start():
+        await runner.setup()
+        await web.TCPSite(runner, HOST, PORT).start()
+        ready.set()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start())
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return loop, runner
+
+
+async def bench(label: str, func) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(func() for _ in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:6.2f} s  {REQUESTS / elapsed:8.1f} req/s")
+    return elapsed
+
+
+async def main():
+    server_loop, runner = serve_in_thread()
+
+    async def rebuild_sync_client():
+        client = OpenAI(api_key="sk-bench", base_url=BASE_URL)
+        client.chat.completions.create(model="mock", messages=MESSAGES)
+
+    pool = LLMClientPool(max_concurrency=CONCURRENCY)
+
+    async def pooled_client():
+        client = pool.get(BASE_URL, "sk-bench")
+        await client.chat(model="mock", messages=MESSAGES)
+
+    try:
+        baseline = await bench("new sync client per request", rebuild_sync_client)
+        fast = await bench(f"shared async pool (x{CONCURRENCY})", pooled_client)
+        print(f"speedup: {baseline / fast:.1f}x")
+    finally:
+        await pool.close()
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(runner.cleanup(), server_loop))
+        server_loop.call_soon_threadsafe(server_loop.stop)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
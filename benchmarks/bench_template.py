@@ -0,0 +1,55 @@
+"""帮助菜单发送路径基准: 每次重建消息链并序列化 vs 预序列化模板
+
+运行: python -m benchmarks.bench_template
+"""
+
+import asyncio
+import time
+
+from pero.core.element import Face, MessageChain, Reply, Text
+from pero.core.template import Slot, encode_frame
+
+HELP_LINES = [f"/command_{i} <参数> —— 第{i}条指令的说明文字" for i in range(20)]
+ROUNDS = 20000
+
+
+def build_chain(name: str) -> MessageChain:
+    chain = MessageChain([Text(f"你好, {name}! 以下是可用指令:\n"), Face(178)])
+    for line in HELP_LINES:
+        chain += Text(line + "\n")
+    chain += Text("发送 /help <指令> 查看详情")
+    return chain
+
+
+def bench(label: str, func) -> float:
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed / ROUNDS * 1e6:8.2f} us/op  {ROUNDS / elapsed:10.0f} ops/s")
+    return elapsed
+
+
+async def main():
+    def rebuild(i: int):
+        chain = build_chain("pero")
+        params = {"group_id": 123456, "message": [Reply(i)] + chain.elements}
+        encode_frame("send_group_msg", params, f"pero-{i}")
+
+    chain = MessageChain([Text("你好, "), Slot("name"), Text("! 以下是可用指令:\n"), Face(178)])
+    for line in HELP_LINES:
+        chain += Text(line + "\n")
+    chain += Text("发送 /help <指令> 查看详情")
+    template = await chain.prepare("group")
+
+    def prepared(i: int):
+        action, params = template.render(123456, reply=i, name="pero")
+        encode_frame(action.lstrip("/"), params, f"pero-{i}")
+
+    baseline = bench("rebuild + json.dumps", rebuild)
+    fast = bench("prepared template", prepared)
+    print(f"speedup: {baseline / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
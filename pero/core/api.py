@@ -1,5 +1,7 @@
-from typing import Union
+import asyncio
+from typing import Any, Dict, Iterable, Optional, Union
 
+from pero.core.bulk import ActionItem, bulk
 from pero.core.element import (
     At,
     CustomMusic,
@@ -16,64 +18,101 @@ from pero.core.element import (
     Text,
     Video,
 )
+from pero.core.history import history_page_fetcher, iter_history
+from pero.core.long_reply import long_reply, split_text
+from pero.core.message_store import message_store
+from pero.core.query_cache import query_cache
 from pero.core.status import Status
+from pero.core.waiter import message_waiter
+from pero.core.websocket import WebSocketClient
+from pero.utils.logger import logger
+
+# 合并转发预览中非文本消息段的占位文本
+FORWARD_PLACEHOLDERS = {
+    "face": "[表情]",
+    "record": "[语音]",
+    "video": "[视频]",
+    "file": "[文件]",
+    "forward": "[聊天记录]",
+    "json": "[卡片消息]",
+    "markdown": "[Markdown]",
+    "dice": "[骰子]",
+    "rps": "[猜拳]",
+    "music": "[音乐]",
+}
 
 
 class API:
 
-    async def _construct_forward_message(self, messages):
-        def decode_summary(report):
-            def decode_single_message(message):
-                if message["type"] == "text":
-                    return message["data"]["text"]
-
-                if message["type"] == "image":
-                    if "summary" in message["data"] and message["data"]["summary"] != "":
-                        return message["data"]["summary"]
-                    return "[图片]"
+    async def _fetch_message(self, message_id: Union[int, str]) -> Optional[Dict[str, Any]]:
+        """获取单条消息详情，失败时返回 None"""
+        try:
+            response = await self.call(*await self.get_msg(message_id))
+        except Exception as e:
+            logger.warning(f"Failed to fetch message {message_id}: {e}")
+            return None
+        if response.get("status") == "failed" or response.get("retcode", 0) != 0:
+            reason = response.get("message") or response.get("wording")
+            logger.warning(f"Failed to fetch message {message_id}: {reason}")
+            return None
+        return response.get("data")
 
-                if message["type"] == "forward":
-                    return "[聊天记录]"
+    async def _construct_forward_message(self, messages: list) -> Dict[str, Any]:
+        """
+        构造合并转发消息，所有引用的消息并发获取
+        :param messages: 消息ID列表，元素为列表时构造为嵌套的合并转发
+        :return: 包含 messages、source、summary、news 的参数
+        """
 
+        def decode_summary(report):
             result = ""
-            for message in report["message"]:
-                result += decode_single_message(message)
+            for message in report.get("message") or []:
+                if message["type"] == "text":
+                    result += message["data"]["text"]
+                elif message["type"] == "image":
+                    result += message["data"].get("summary") or "[图片]"
+                else:
+                    result += FORWARD_PLACEHOLDERS.get(message["type"], "")
             return result
 
-        message_content, reports, news = [], [], []
-        for msg_id in messages:
-            report = await self.get_msg(msg_id)
-            report = report["data"]
-            reports.append(report)
-            node = {
-                "type": "node",
-                "data": {
-                    "nickname": report["sender"]["nickname"],
-                    "user_id": report["user_id"],
-                    "id": msg_id,
-                },
-            }
-            message_content.append(node)
-            news.append({"text": report["sender"]["nickname"] + ": " + decode_summary(report)})
-
-        if len(news) > 4:
-            news = news[:4]
-
-        if report["message_type"] == "group":
+        fetches = [
+            self._construct_forward_message(item) if isinstance(item, list) else self._fetch_message(item)
+            for item in messages
+        ]
+        results = await asyncio.gather(*fetches)
+
+        message_content, news, participants = [], [], []
+        is_group = False
+        for item, report in zip(messages, results):
+            if isinstance(item, list):
+                # 嵌套转发: 节点内容为子转发的节点列表
+                nested = {"nickname": report["source"], "content": report.pop("messages"), **report}
+                message_content.append({"type": "node", "data": nested})
+                news.append({"text": f"{report['source']}: [聊天记录]"})
+                continue
+            if report is None:
+                # 获取失败的消息仍按 ID 引用，由 NapCat 解析内容
+                message_content.append({"type": "node", "data": {"id": item}})
+                continue
+            nickname = report["sender"]["nickname"]
+            message_content.append(
+                {"type": "node", "data": {"nickname": nickname, "user_id": report["user_id"], "id": item}}
+            )
+            news.append({"text": f"{nickname}: {decode_summary(report)}"})
+            is_group = is_group or report.get("message_type") == "group"
+            if nickname not in participants:
+                participants.append(nickname)
+
+        if is_group or not participants:
             target = "群聊"
         else:
-            participants = list(set([record["sender"]["nickname"] for record in reports]))
-            if len(participants) == 1:
-                target = participants[0]
-            else:
-                assert len(participants) == 2
-                target = participants[0] + "和" + participants[1]
+            target = "和".join(participants[:2])
 
         return {
             "messages": message_content,
             "source": f"{target}的聊天记录",
             "summary": f"查看{len(message_content)}条转发消息",
-            "news": news,
+            "news": news[:4],
         }
 
     # TODO: 用户接口
@@ -344,6 +383,26 @@ class API:
             },
         )
 
+    def iter_group_msg_history(
+        self,
+        group_id: Union[int, str],
+        start_seq: Union[int, str] = 0,
+        page_size: int = 20,
+        limit: Optional[int] = None,
+        since: Optional[float] = None,
+    ):
+        """
+        用法: async for message in pero.iter_group_msg_history(group_id, limit=1000): ...
+        :param group_id: 群号
+        :param start_seq: 起始消息序号，0 表示从最新的消息开始
+        :param page_size: 每页条数
+        :param limit: 最多获取的条数
+        :param since: 只获取该时间戳(秒)之后的消息
+        :return: 从新到旧逐条产出群消息历史记录的异步迭代器，自动翻页并预取下一页
+        """
+        fetch = history_page_fetcher(self.call, "get_group_msg_history", group_id=group_id)
+        return iter_history(fetch, start_seq=start_seq, page_size=page_size, limit=limit, since=since)
+
     async def set_msg_emoji_like(self, message_id: Union[int, str], emoji_id: int, emoji_set: bool):
         """
         :param message_id: 消息ID
@@ -380,6 +439,25 @@ class API:
             },
         )
 
+    def iter_friend_msg_history(
+        self,
+        user_id: Union[int, str],
+        start_seq: Union[int, str] = 0,
+        page_size: int = 20,
+        limit: Optional[int] = None,
+        since: Optional[float] = None,
+    ):
+        """
+        :param user_id: QQ号
+        :param start_seq: 起始消息序号，0 表示从最新的消息开始
+        :param page_size: 每页条数
+        :param limit: 最多获取的条数
+        :param since: 只获取该时间戳(秒)之后的消息
+        :return: 从新到旧逐条产出好友消息历史记录的异步迭代器，自动翻页并预取下一页
+        """
+        fetch = history_page_fetcher(self.call, "get_friend_msg_history", user_id=user_id)
+        return iter_history(fetch, start_seq=start_seq, page_size=page_size, limit=limit, since=since)
+
     async def get_recent_contact(self, count: int):
         """
         获取的最新消息是每个会话最新的消息
@@ -483,9 +561,12 @@ class API:
     async def send_private_forward_msg(self, user_id: Union[int, str], messages: list[str]):
         """
         :param user_id: 发送对象QQ号
-        :param messages: 消息列表
+        :param messages: 消息ID列表，元素为列表时构造为嵌套的合并转发
         :return: 合并转发私聊消息
         """
+        if len(messages) == 0:
+            return None
+
         payload = await self._construct_forward_message(messages)
         payload["user_id"] = user_id
         return ("/send_private_forward_msg", payload)
@@ -867,7 +948,7 @@ class API:
     async def send_group_forward_msg(self, group_id: Union[int, str], messages: list[str]):
         """
         :param group_id: 群号
-        :param messages: 消息列表
+        :param messages: 消息ID列表，元素为列表时构造为嵌套的合并转发
         :return: 合并转发的群聊消息
         """
         if len(messages) == 0:
@@ -876,7 +957,7 @@ class API:
         payload = await self._construct_forward_message(messages)
         payload["group_id"] = group_id
 
-        return ("/send_private_forward_msg", payload)
+        return ("/send_group_forward_msg", payload)
 
     # TODO: 系统接口
     async def get_client_key(self):
@@ -1130,27 +1211,26 @@ class API:
         if image:
             message.append(Image(image))
         if rtf:
-            # 首先检查是否有 reply，只取第一个
+            # 一次遍历: 取第一个 reply，同时区分基本元素(at/图片/文本/表情)和其他元素
+            basic_types = {"at", "image", "text", "face", "dice", "rps"}
             reply_elem = None
+            basic_elems, other_elems = [], []
             for elem in rtf.elements:
-                if elem["type"] == "reply":
-                    reply_elem = Reply(elem["data"]["id"])
-                    break
+                elem_type = elem["type"]
+                if elem_type == "reply":
+                    if reply_elem is None:
+                        reply_elem = elem
+                elif elem_type in basic_types:
+                    basic_elems.append(elem)
+                else:
+                    other_elems.append(elem)
 
             # 如果有 reply，插入到消息开头
             if reply_elem:
                 message.insert(0, reply_elem)
 
-            # 检查是否包含基本元素(at/图片/文本/表情)
-            basic_types = {"at", "image", "text", "face", "dice", "rps"}
-            basic_elems = [elem for elem in rtf.elements if elem["type"] in basic_types]
-
-            if basic_elems:  # 如果存在基本元素
-                # 只添加基本元素
-                message.extend(basic_elems)
-            else:
-                # 如果没有基本元素，才使用所有非reply元素
-                message.extend([elem for elem in rtf.elements if elem["type"] != "reply"])
+            # 存在基本元素时只添加基本元素，否则使用所有非reply元素
+            message.extend(basic_elems or other_elems)
         if not message:
             return {"code": 0, "msg": "消息不能为空"}
         params = {"group_id": group_id, "message": message}
@@ -1208,16 +1288,10 @@ class API:
         if image:
             message.append(Image(image))
         if rtf:
-            # 检查是否包含基本元素(at/图片/文本/表情)
-            basic_types = {"at", "image", "text", "face"}  # 定义基本元素类型
+            # 检查是否包含基本元素(at/图片/文本/表情)，没有基本元素时才使用所有元素
+            basic_types = {"at", "image", "text", "face"}
             basic_elems = [elem for elem in rtf.elements if elem["type"] in basic_types]
-
-            if basic_elems:  # 如果存在基本元素
-                # 只添加基本元素
-                message.extend(basic_elems)
-            else:
-                # 如果没有基本元素，才使用所有元素
-                message.extend(rtf.elements)
+            message.extend(basic_elems or rtf.elements)
         if not message:
             return {"code": 0, "msg": "消息不能为空"}
         params = {"user_id": user_id, "message": message}
@@ -1339,9 +1413,87 @@ class API:
         :param message: 包含source, target, reply等信息的消息对象
         :param args: 参数
         :param kwargs: 参数
-        :return: 发送消息
+        :return: 发送消息，超长文本分段发送时返回 None
         """
+        if not args and long_reply.needs_split(kwargs.get("text")):
+            return await self._post_long_text(message.source, message.target, message.reply, **kwargs)
         return await self.post_msg(message.source, message.target, reply=message.reply, *args, **kwargs)
 
+    async def _post_long_text(self, source: str, target: Union[int, str], reply=None, text: str = "", **kwargs):
+        """
+        发送超长文本: 超过转发阈值时合并转发，否则按句子分段，第一段立即发送、其余段间隔发送
+        :param source: 事件来源
+        :param target: 目标群号或QQ号
+        :param reply: 回复的消息ID，附在第一段上
+        :param text: 文本
+        :param kwargs: 其他消息元素，附在第一段上
+        """
+        chunks = split_text(text, long_reply.max_chars)
+        if long_reply.use_forward(text) and not any(kwargs.values()):
+            payload = long_reply.forward_payload(chunks)
+            if source == "group":
+                return ("/send_group_forward_msg", {**payload, "group_id": target})
+            elif source == "private":
+                return ("/send_private_forward_msg", {**payload, "user_id": target})
+            raise Exception("Unknown source type")
+
+        async def build(chunk: str, first: bool):
+            if first:
+                return await self.post_msg(source, target, reply=reply, text=chunk, **kwargs)
+            return await self.post_msg(source, target, text=chunk)
+
+        long_reply.send_paced(chunks, build)
+        return None
+
+    async def wait_next(self, message, timeout: float = 45.0, predicate=None):
+        """
+        等待同一会话(来源、目标、用户)中的下一条消息
+        :param message: 当前消息对象
+        :param timeout: 超时时间(秒)，应小于处理器超时 message_adapter.handler_timeout
+        :param predicate: 过滤函数，返回 True 的消息才会被接收
+        :return: 下一条消息，超时返回 None
+        """
+        return await message_waiter.wait(message, timeout=timeout, predicate=predicate)
+
+    async def call(self, action: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        """
+        立即发送请求并等待 NapCat 响应
+        :param action: 动作名
+        :param params: 参数
+        :param timeout: 超时时间(秒)
+        :return: NapCat 响应，包含 status、retcode、data 等字段
+        """
+        action = action.replace("/", "")
+        if action == "get_msg":
+            # 最近收发过的消息直接从本地存储返回
+            record = await message_store.get(params["message_id"])
+            if record is not None:
+                return {"status": "ok", "retcode": 0, "data": record, "message": "", "wording": ""}
+
+        cached = query_cache.get(action, params)
+        if cached is not None:
+            return cached
+
+        client = WebSocketClient.instance
+        if client is None:
+            raise ConnectionError("WebSocket client not initialized")
+        response = await client.call(action, params, timeout=timeout)
+        if action == "get_msg" and response.get("retcode", 0) == 0 and response.get("data"):
+            message_store.add(response["data"])
+        query_cache.set(action, params, response)
+        return response
+
+    def bulk(self, actions: Iterable[ActionItem], concurrency: int = 8, rate: Optional[float] = None, **kwargs):
+        """
+        批量执行动作，限制并发和速率，按完成顺序产出结果
+        用法: async for result in pero.bulk((pero.get_group_member_list(g) for g in groups), rate=20): ...
+        :param actions: (action, params) 元组或 API 方法返回的协程
+        :param concurrency: 最大并发请求数
+        :param rate: 每秒最多发起的请求数
+        :param kwargs: retries, retry_delay, progress, checkpoint 等，见 pero.core.bulk.bulk
+        :return: BulkResult 异步迭代器
+        """
+        return bulk(actions, self.call, concurrency=concurrency, rate=rate, **kwargs)
+
 
 PERO_API = API()
@@ -4,11 +4,17 @@ from contextlib import AsyncExitStack
 from typing import Optional
 
 from pero.core.event import EventHandler, EventParser
+from pero.core.message_store import message_store
+from pero.core.scheduler import scheduler
+from pero.core.session import session_store
 from pero.core.task_manager import TaskManager
 from pero.core.websocket import WebSocketClient
 from pero.plugin.plugin_manager import plugin_manager
 from pero.utils.config import config_manager
+from pero.utils.http import http_client
+from pero.utils.llm import llm_pool
 from pero.utils.logger import logger
+from pero.utils.media import media_encoder
 
 
 class Application:
@@ -41,6 +47,9 @@ class Application:
         # 加载插件
         await self._load_plugins()
 
+        # 启动定时任务调度
+        scheduler.start()
+
         logger.info("Application initialized successfully")
 
     async def _load_config(self):
@@ -77,14 +86,24 @@ class Application:
         if self.task_manager:
             await self.task_manager.shutdown()
 
+        # 停止定时任务并保存上次运行时间
+        await scheduler.close()
+
         # 关闭插件管理器
         await self.plugin_manager.shutdown()
 
+        # 写入剩余的会话数据
+        await session_store.close()
+        await message_store.close()
+
         # 关闭热配置
         self.config.stop_watcher()
 
         # 关闭其他资源
         await self.exit_stack.aclose()
+        await llm_pool.close()
+        await http_client.close()
+        media_encoder.close()
 
         logger.info("Application shutdown complete")
 
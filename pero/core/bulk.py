@@ -0,0 +1,195 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from pero.utils.logger import logger
+from pero.utils.rate_limit import RateLimiter
+
+ActionTuple = Tuple[str, Dict[str, Any]]
+# 批量任务的输入项: (action, params) 元组，或返回该元组的协程(例如 pero.set_group_ban(...))
+ActionItem = Union[ActionTuple, Awaitable[ActionTuple]]
+Call = Callable[[str, Optional[Dict[str, Any]]], Awaitable[Dict[str, Any]]]
+
+
+@dataclass
+class BulkResult:
+    """单个动作的执行结果"""
+
+    index: int
+    action: str
+    params: Optional[Dict[str, Any]]
+    response: Optional[Dict[str, Any]] = None
+    error: Optional[BaseException] = None
+    attempts: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and is_success(self.response)
+
+    @property
+    def data(self) -> Any:
+        return (self.response or {}).get("data")
+
+
+def is_success(response: Optional[Dict[str, Any]]) -> bool:
+    """NapCat 响应是否成功"""
+    return bool(response) and response.get("status") != "failed" and response.get("retcode", 0) == 0
+
+
+class BulkCheckpoint:
+    """记录已成功完成的动作序号，用于中断后续跑
+
+    连续完成的前缀只保存为一个水位线，文件大小只与乱序完成的数量有关。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.watermark = 0
+        self.done: Set[int] = set()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                self.watermark = state.get("watermark", 0)
+                self.done = set(state.get("done", []))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Failed to load bulk checkpoint {path}: {e}")
+
+    def is_done(self, index: int) -> bool:
+        return index < self.watermark or index in self.done
+
+    def mark(self, index: int):
+        self.done.add(index)
+        while self.watermark in self.done:
+            self.done.remove(self.watermark)
+            self.watermark += 1
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"watermark": self.watermark, "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.path)
+
+
+async def bulk(
+    actions: Iterable[ActionItem],
+    call: Call,
+    concurrency: int = 8,
+    rate: Optional[float] = None,
+    retries: int = 2,
+    retry_delay: float = 1.0,
+    progress: Optional[Callable[[int, int], Any]] = None,
+    checkpoint: Optional[str] = None,
+    checkpoint_interval: float = 5.0,
+) -> AsyncIterator[BulkResult]:
+    """批量执行动作，按完成顺序逐个产出结果
+
+    :param actions: 动作序列，惰性读取，可以是生成器
+    :param call: 发送请求并返回响应的函数
+    :param concurrency: 最大并发请求数
+    :param rate: 每秒最多发起的请求数，None 表示不限速
+    :param retries: retcode 失败或异常时的重试次数
+    :param retry_delay: 首次重试等待时间(秒)，之后指数退避
+    :param progress: 进度回调 progress(完成数, 失败数)，可以是协程函数
+    :param checkpoint: 断点文件路径，已成功的动作在重跑时跳过
+    :param checkpoint_interval: 断点文件保存间隔(秒)
+    """
+    limiter = RateLimiter(rate)
+    state = BulkCheckpoint(checkpoint) if checkpoint else None
+    items: Iterator[Tuple[int, ActionItem]] = iter(enumerate(actions))
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    counters = {"done": 0, "failed": 0}
+    last_saved = time.monotonic()
+
+    async def run(index: int, item: ActionItem) -> BulkResult:
+        if inspect.isawaitable(item):
+            item = await item
+        action, params = item
+        result = BulkResult(index, action.replace("/", ""), params)
+        for attempt in range(retries + 1):
+            await limiter.acquire()
+            result.attempts = attempt + 1
+            try:
+                result.response = await call(result.action, params)
+                result.error = None
+            except Exception as e:
+                result.error = e
+            if result.ok:
+                break
+            if attempt < retries:
+                await asyncio.sleep(retry_delay * (2**attempt))
+        return result
+
+    async def worker():
+        for index, item in items:
+            if state and state.is_done(index):
+                if inspect.iscoroutine(item):
+                    item.close()
+                continue
+            try:
+                result = await run(index, item)
+            except Exception as e:
+                result = BulkResult(index, "", None, error=e)
+            await results.put(result)
+
+    async def supervise():
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            # 动作序列抛出异常时也要通知消费端结束，异常随后由 await supervisor 抛给调用方
+            await results.put(None)
+
+    supervisor = asyncio.create_task(supervise())
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            counters["done"] += 1
+            if result.ok:
+                if state:
+                    state.mark(result.index)
+            else:
+                counters["failed"] += 1
+                logger.warning(f"Bulk action #{result.index} {result.action} failed: {result.error or result.response}")
+            if progress:
+                ret = progress(counters["done"], counters["failed"])
+                if inspect.isawaitable(ret):
+                    await ret
+            if state and time.monotonic() - last_saved > checkpoint_interval:
+                state.save()
+                last_saved = time.monotonic()
+            yield result
+        await supervisor
+    finally:
+        if not supervisor.done():
+            supervisor.cancel()
+            try:
+                await supervisor
+            except asyncio.CancelledError:
+                pass
+        if state:
+            state.save()
+        logger.info(f"Bulk job finished: {counters['done']} done, {counters['failed']} failed")
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import json
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pero.core.session import SessionKey, SessionStore, make_session_key, session_store
+from pero.utils.logger import logger
+from pero.utils.tokens import estimate_messages_tokens
+
+Turn = Dict[str, str]
+# summarize(已有摘要, 待总结的对话) -> 新摘要
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+
+class ChatHistory:
+    """按 token 预算裁剪的多轮对话历史
+
+    每个会话的历史保存在 session_store 中(内存 LRU + SQLite)，只保留预算内的最近几轮。
+    超出预算的旧对话移入待总结列表，由后台任务合并进摘要，不占用回复路径。
+    同一会话的读改写按会话加锁串行执行；历史总是按整轮(用户 + 助手)增删。
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        budget: int = 2000,
+        summarize: Optional[Summarizer] = None,
+        store: SessionStore = session_store,
+    ):
+        self.namespace = namespace
+        self.budget = budget
+        self.summarize = summarize
+        self.store = store
+        self._summarizing: Dict[str, asyncio.Task] = {}
+        # 会话锁只在有协程持有时存活
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        # 统计信息
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def _key(self, session_key: SessionKey) -> str:
+        if isinstance(session_key, tuple):
+            session_key = make_session_key(*session_key)
+        return f"chat:{self.namespace}:{session_key}"
+
+    def _lock(self, key: str) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    async def _load(self, key: str) -> Dict[str, Any]:
+        state = await self.store.get(key) or {}
+        return {
+            "summary": state.get("summary", ""),
+            "turns": list(state.get("turns", [])),
+            "pending": list(state.get("pending", [])),
+            # 已从待总结列表头部移除的条数，用于在总结完成后按位置移除已总结的部分
+            "pending_start": state.get("pending_start", 0),
+        }
+
+    async def build_messages(self, session_key: SessionKey, system: str, text: str) -> List[Turn]:
+        """组装请求消息: 系统提示、历史摘要、预算内最近的几轮对话和本次输入"""
+        state = await self._load(self._key(session_key))
+        messages = [{"role": "system", "content": system}]
+        if state["summary"]:
+            messages.append({"role": "system", "content": f"此前对话的摘要: {state['summary']}"})
+        user = {"role": "user", "content": text}
+
+        remaining = self.budget - estimate_messages_tokens(messages) - estimate_messages_tokens([user])
+        turns = state["turns"]
+        start = len(turns)
+        # 按整轮从新到旧选取，不拆开一轮中的提问和回答
+        while start > 0:
+            turn = turns[max(start - 2, 0) : start]
+            remaining -= estimate_messages_tokens(turn)
+            if remaining < 0:
+                break
+            start -= len(turn)
+        messages.extend(turns[start:])
+        messages.append(user)
+        return messages
+
+    async def append(self, session_key: SessionKey, text: str, reply: str):
+        """记录一轮对话，超出预算的旧对话转入后台总结"""
+        key = self._key(session_key)
+        async with self._lock(key):
+            state = await self._load(key)
+            turns = state["turns"]
+            turns.append({"role": "user", "content": text})
+            turns.append({"role": "assistant", "content": reply})
+
+            if estimate_messages_tokens(turns) > self.budget:
+                # 一次移出足够多的旧对话，避免每轮都触发总结
+                target = self.budget // 2
+                while len(turns) > 2 and estimate_messages_tokens(turns) > target:
+                    state["pending"].extend(turns[:2])
+                    del turns[:2]
+                if not self.summarize:
+                    self._drop_pending(state, len(state["pending"]))
+                # 总结持续失败时丢弃最旧的待总结对话，保持历史大小有界
+                while len(state["pending"]) > 2 and estimate_messages_tokens(state["pending"]) > self.budget * 2:
+                    self._drop_pending(state, 2)
+            await self.store.set(key, state)
+        if state["pending"]:
+            self._schedule_summary(key)
+
+    async def digest(self, session_key: SessionKey) -> str:
+        """历史内容的摘要哈希，历史为空时返回空字符串"""
+        state = await self._load(self._key(session_key))
+        if not state["summary"] and not state["turns"]:
+            return ""
+        raw = json.dumps([state["summary"], state["turns"]], ensure_ascii=False, sort_keys=True)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    async def clear(self, session_key: SessionKey):
+        key = self._key(session_key)
+        async with self._lock(key):
+            await self.store.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "summarizing": len(self._summarizing),
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+        }
+
+    @staticmethod
+    def _drop_pending(state: Dict[str, Any], count: int):
+        """从待总结列表头部移除 count 条"""
+        count = max(0, min(count, len(state["pending"])))
+        del state["pending"][:count]
+        state["pending_start"] += count
+
+    def _schedule_summary(self, key: str):
+        if key in self._summarizing:
+            return
+        task = asyncio.create_task(self._summarize_pending(key))
+        self._summarizing[key] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(key, None))
+
+    async def _summarize_pending(self, key: str):
+        while True:
+            state = await self._load(key)
+            pending = state["pending"]
+            if not pending:
+                return
+            start = state["pending_start"]
+            try:
+                summary = await self.summarize(state["summary"], pending)
+            except Exception as e:
+                self.summary_failures += 1
+                logger.warning(f"Failed to summarize chat history {key}: {e}")
+                return
+            async with self._lock(key):
+                # 总结期间可能有新的对话转入尾部或旧的从头部被丢弃，按位置只移除仍留在列表中的已总结部分
+                state = await self._load(key)
+                state["summary"] = summary
+                self._drop_pending(state, start + len(pending) - state["pending_start"])
+                await self.store.set(key, state)
+            self.summaries += 1
@@ -0,0 +1,78 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+@dataclass
+class _Pending:
+    texts: List[str] = field(default_factory=list)
+    generation: int = 0
+    task: Optional[asyncio.Future] = None
+    running: int = 0  # 正在执行的调用对应的 generation
+    committed: bool = False
+
+
+class Debouncer:
+    """按会话合并短时间内连续到达的消息
+
+    同一会话中每条新消息都会重新开始等待窗口，窗口内没有新消息时才用合并后的文本调用处理函数；
+    新消息到达时正在进行的调用会被取消，其文本并入下一次调用。
+    处理函数已经发出部分回复时应调用 commit，之后该调用不再被取消，新消息作为下一轮单独处理。
+    """
+
+    def __init__(self, window: float = 1.0, separator: str = "\n"):
+        self.window = window
+        self.separator = separator
+        self._pending: Dict[Hashable, _Pending] = {}
+
+        # 统计信息
+        self.calls = 0
+        self.merged = 0
+        self.cancelled = 0
+
+    async def run(self, key: Hashable, text: str, func: Callable[[str], Awaitable[Any]]) -> Optional[Any]:
+        """提交一条消息，返回处理结果；被同一会话的后续消息取代时返回 None"""
+        pending = self._pending.get(key)
+        if pending is None or pending.committed:
+            pending = self._pending[key] = _Pending()
+        pending.texts.append(text)
+        pending.generation += 1
+        generation = pending.generation
+        if pending.task is not None and not pending.task.done():
+            pending.task.cancel()
+            self.cancelled += 1
+
+        await asyncio.sleep(self.window)
+        if pending.generation != generation:
+            self.merged += 1
+            return None
+
+        pending.running = generation
+        pending.task = asyncio.ensure_future(func(self.separator.join(pending.texts)))
+        self.calls += 1
+        try:
+            result = await pending.task
+        except asyncio.CancelledError:
+            if pending.generation != generation:
+                # 被后续消息取代
+                return None
+            raise
+        finally:
+            if pending.generation == generation and self._pending.get(key) is pending:
+                del self._pending[key]
+        return result
+
+    def commit(self, key: Hashable):
+        """在处理函数中调用: 回复已经开始发送，本次调用不再被后续消息取消"""
+        pending = self._pending.get(key)
+        # 已有新消息到达(取消即将生效)时不再提交
+        if pending is not None and pending.task is asyncio.current_task() and pending.generation == pending.running:
+            pending.committed = True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting": len(self._pending),
+            "calls": self.calls,
+            "merged": self.merged,
+            "cancelled": self.cancelled,
+        }
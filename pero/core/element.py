@@ -1,99 +1,112 @@
 import json
-from typing import Union
+from typing import List, Union
 
+from pero.core.segment import Segment, json_default
+from pero.core.template import MessageTemplate, Slot
 from pero.utils.io import convert_uploadable_object
 
 
+def _to_segments(item) -> List[Segment]:
+    """将消息链的输入项转换为消息段列表"""
+    if isinstance(item, Segment):
+        return [item]
+    if isinstance(item, MessageChain):
+        return item.chain
+    if isinstance(item, str):
+        # Slot 也是 str，保留其槽位信息
+        return [Text(item if isinstance(item, Slot) else str(item))]
+    if isinstance(item, dict):
+        return [Segment.from_dict(item)]
+    if isinstance(item, list):
+        # 处理嵌套列表
+        return [segment for sub_item in item for segment in _to_segments(sub_item)]
+    return [Text(str(item))]
+
+
 class MessageChain:
     """消息链"""
 
+    __slots__ = ("chain",)
+
     def __init__(self, chain=None):
-        self.chain = []
+        self.chain: List[Segment] = []
         if chain is None:
             return
-
-        if isinstance(chain, str):
-            self.chain = [Text(chain)]
-        elif isinstance(chain, list):
-            # 处理列表输入
-            for item in chain:
-                if isinstance(item, dict):
-                    self.chain.append(item)
-                elif isinstance(item, Element):
-                    self.chain.append(item)
-                elif isinstance(item, list):
-                    # 处理嵌套列表
-                    for sub_item in item:
-                        if isinstance(sub_item, dict):
-                            self.chain.append(sub_item)
-                        elif isinstance(sub_item, Element):
-                            self.chain.append(sub_item)
-                        else:
-                            self.chain.append(Text(str(sub_item)))
-                else:
-                    self.chain.append(Text(str(item)))
-        elif isinstance(chain, Element):
-            self.chain = [chain]
-        else:
-            self.chain = [Text(str(chain))]
+        self.chain = _to_segments(chain)
 
     def __str__(self):
         """确保字符串表示时保持顺序"""
-        return json.dumps(self.chain, ensure_ascii=False)
+        return json.dumps(self.chain, ensure_ascii=False, default=json_default)
 
     @property
     def elements(self) -> list:
-        """将消息链转换为可序列化的字典列表"""
+        """消息段列表，序列化在发送时进行"""
         return self.chain
 
     def __add__(self, other):
         """支持使用 + 连接两个消息链"""
-        if isinstance(other, MessageChain):
-            return MessageChain(self.chain + other.chain)
-        return MessageChain(self.chain + [other])
+        result = MessageChain()
+        result.chain = self.chain + _to_segments(other)
+        return result
 
     def __iadd__(self, other):
-        if isinstance(other, MessageChain):
-            self.chain += other.chain
-        else:
-            self.chain += MessageChain([other]).chain
+        self.chain.extend(_to_segments(other))
+        return self
+
+    def append(self, item) -> "MessageChain":
+        """追加消息元素"""
+        self.chain.extend(_to_segments(item))
         return self
 
+    async def prepare(self, source: str = "group") -> MessageTemplate:
+        """预序列化为消息模板，静态部分只序列化一次，发送时只填充目标、回复和 Slot 槽位
+
+        用法: template = await MessageChain(["你好, ", Slot("name")]).prepare()
+              return template.render_for(message, name="pero")
+        """
+        return await MessageTemplate.build(self.chain, source=source)
+
     def display(self) -> str:
         """获取消息链的字符串表示"""
         result = []
         for elem in self.chain:
-            if elem["type"] == "text":
-                result.append(elem["data"]["text"])
-            elif elem["type"] == "image":
+            if elem.type == "text":
+                result.append(elem.data["text"])
+            elif elem.type == "image":
                 result.append("[图片]")
-            elif elem["type"] == "at":
-                result.append(f"@{elem['data']['qq']}")
-            elif elem["type"] == "face":
+            elif elem.type == "at":
+                result.append(f"@{elem.data['qq']}")
+            elif elem.type == "face":
                 result.append("[表情]")
-            elif elem["type"] == "music":
+            elif elem.type == "music":
                 result.append("[音乐]")
-            elif elem["type"] == "video":
+            elif elem.type == "video":
                 result.append("[视频]")
-            elif elem["type"] == "dice":
+            elif elem.type == "dice":
                 result.append("[骰子]")
-            elif elem["type"] == "rps":
+            elif elem.type == "rps":
                 result.append("[猜拳]")
-            elif elem["type"] == "json":
+            elif elem.type == "json":
                 result.append("[JSON]")
         return "".join(result)
 
 
 class Element:
-    """消息元素基类"""
+    """消息元素基类
+
+    实例化时直接返回消息段(Segment)而不是类实例，子类实现 build 构造消息段。
+    只实现了 __init__ 和 to_dict 的旧式子类仍然可用。
+    """
 
     type: str = "element"
 
     def __new__(cls, *args, **kwargs):
-        """直接返回字典而不是类实例"""
+        build = getattr(cls, "build", None)
+        if build is not None:
+            return build(*args, **kwargs)
         instance = super().__new__(cls)
         instance.__init__(*args, **kwargs)
-        return instance.to_dict()
+        return Segment.from_dict(instance.to_dict())
 
 
 class Text(Element):
@@ -101,14 +114,9 @@ class Text(Element):
 
     type = "text"
 
-    def __init__(self, text: str):
-        self.text = text
-
-    def to_dict(self) -> dict:
-        if self.text:
-            return {"type": "text", "data": {"text": self.text}}
-        else:
-            return {"type": "text", "data": {"text": ""}}
+    @classmethod
+    def build(cls, text: str) -> Segment:
+        return Segment("text", {"text": text or ""})
 
 
 class At(Element):
@@ -116,11 +124,9 @@ class At(Element):
 
     type = "at"
 
-    def __init__(self, qq: Union[int, str]):
-        self.qq = qq
-
-    def to_dict(self) -> dict:
-        return {"type": "at", "data": {"qq": self.qq}}
+    @classmethod
+    def build(cls, qq: Union[int, str]) -> Segment:
+        return Segment("at", {"qq": qq})
 
 
 class AtAll(Element):
@@ -128,8 +134,9 @@ class AtAll(Element):
 
     type = "at"
 
-    def as_dict(self):
-        return {"type": "at", "data": {"qq": "all"}}
+    @classmethod
+    def build(cls) -> Segment:
+        return Segment("at", {"qq": "all"})
 
 
 class Image(Element):
@@ -137,11 +144,9 @@ class Image(Element):
 
     type = "image"
 
-    def __init__(self, path: str):
-        self.path = path
-
-    def to_dict(self) -> dict:
-        return convert_uploadable_object(self.path, "image")
+    @classmethod
+    def build(cls, path: str) -> Segment:
+        return Segment.from_dict(convert_uploadable_object(path, "image"))
 
 
 class Face(Element):
@@ -149,11 +154,9 @@ class Face(Element):
 
     type = "face"
 
-    def __init__(self, face_id: int):
-        self.id = face_id
-
-    def to_dict(self) -> dict:
-        return {"type": "face", "data": {"id": self.id}}
+    @classmethod
+    def build(cls, face_id: int) -> Segment:
+        return Segment("face", {"id": face_id})
 
 
 class Reply(Element):
@@ -161,11 +164,9 @@ class Reply(Element):
 
     type = "reply"
 
-    def __init__(self, message_id: Union[int, str]):
-        self.message_id = str(message_id)
-
-    def to_dict(self) -> dict:
-        return {"type": "reply", "data": {"id": self.message_id}}
+    @classmethod
+    def build(cls, message_id: Union[int, str]) -> Segment:
+        return Segment("reply", {"id": str(message_id)})
 
 
 class Json(Element):
@@ -173,11 +174,9 @@ class Json(Element):
 
     type = "json"
 
-    def __init__(self, data: str):
-        self.data = data
-
-    def to_dict(self) -> dict:
-        return {"type": "json", "data": {"data": self.data}}
+    @classmethod
+    def build(cls, data: str) -> Segment:
+        return Segment("json", {"data": data})
 
 
 class Record(Element):
@@ -185,11 +184,9 @@ class Record(Element):
 
     type = "record"
 
-    def __init__(self, file: str):
-        self.file = file
-
-    def to_dict(self) -> dict:
-        return {"type": "record", "data": {"file": self.file}}
+    @classmethod
+    def build(cls, file: str) -> Segment:
+        return Segment("record", {"file": file})
 
 
 class Video(Element):
@@ -197,11 +194,9 @@ class Video(Element):
 
     type = "video"
 
-    def __init__(self, file: str):
-        self.file = file
-
-    def to_dict(self) -> dict:
-        return {"type": "video", "data": {"file": self.file}}
+    @classmethod
+    def build(cls, file: str) -> Segment:
+        return Segment("video", {"file": file})
 
 
 class Dice(Element):
@@ -209,8 +204,9 @@ class Dice(Element):
 
     type = "dice"
 
-    def to_dict(self) -> dict:
-        return {"type": "dice"}
+    @classmethod
+    def build(cls) -> Segment:
+        return Segment("dice")
 
 
 class Rps(Element):
@@ -218,8 +214,9 @@ class Rps(Element):
 
     type = "rps"
 
-    def to_dict(self) -> dict:
-        return {"type": "rps"}
+    @classmethod
+    def build(cls) -> Segment:
+        return Segment("rps")
 
 
 class Music(Element):
@@ -227,12 +224,9 @@ class Music(Element):
 
     type = "music"
 
-    def __init__(self, type: str, id: str):
-        self.music_type = type
-        self.music_id = id
-
-    def to_dict(self) -> dict:
-        return {"type": "music", "data": {"type": self.music_type, "id": self.music_id}}
+    @classmethod
+    def build(cls, type: str, id: str) -> Segment:
+        return Segment("music", {"type": type, "id": id})
 
 
 class CustomMusic(Element):
@@ -240,25 +234,19 @@ class CustomMusic(Element):
 
     type = "music"
 
-    def __init__(self, url: str, audio: str, title: str, image: str = "", singer: str = ""):
-        self.url = url
-        self.audio = audio
-        self.title = title
-        self.image = image
-        self.singer = singer
-
-    def to_dict(self) -> dict:
-        return {
-            "type": "music",
-            "data": {
+    @classmethod
+    def build(cls, url: str, audio: str, title: str, image: str = "", singer: str = "") -> Segment:
+        return Segment(
+            "music",
+            {
                 "type": "custom",
-                "url": self.url,
-                "audio": self.audio,
-                "title": self.title,
-                "image": self.image,
-                "singer": self.singer,
+                "url": url,
+                "audio": audio,
+                "title": title,
+                "image": image,
+                "singer": singer,
             },
-        }
+        )
 
 
 # TODO
@@ -279,8 +267,6 @@ class File(Element):
 
     type = "file"
 
-    def __init__(self, file: str):
-        self.file = file
-
-    def to_dict(self) -> dict:
-        return convert_uploadable_object(self.file, "file")
+    @classmethod
+    def build(cls, file: str) -> Segment:
+        return Segment.from_dict(convert_uploadable_object(file, "file"))
@@ -2,6 +2,9 @@ import asyncio
 from typing import Any, Callable, Dict, List, Optional
 
 from pero.core.message_adapter import MessageAdapter
+from pero.core.message_store import message_store
+from pero.core.query_cache import query_cache
+from pero.core.scheduler import scheduler
 from pero.utils.logger import logger
 
 
@@ -127,6 +130,9 @@ class EventParser:
         """
         解析消息事件，根据消息的类型、来源、发送者等信息，转化为统一结构。
         """
+        # 保存到最近消息存储，供引用、转发等查询
+        message_store.add_event(event)
+
         # 基本字段解析
         source = event.get("message_type")  # "private" 或 "group"
         sender = event.get("sub_type")  # "friend" 或 "other"
@@ -140,6 +146,7 @@ class EventParser:
         # 获取目标来源
         target = event.get("target_id") or event.get("group_id")
         reply = event.get("message_id")
+        user_id = event.get("user_id")
 
         # 构建最终统一结构
         return {
@@ -150,9 +157,26 @@ class EventParser:
             "content": content,
             "target": target,
             "reply": reply,
+            "user_id": user_id,
         }
 
 
+@EventHandler.register("notice", "group_increase")
+@EventHandler.register("notice", "group_decrease")
+@EventHandler.register("notice", "group_card")
+@EventHandler.register("notice", "group_admin")
+@EventHandler.register("notice", "friend_add")
+async def invalidate_query_cache(event: Dict[str, Any]) -> None:
+    """成员、名片、管理员和好友变动时作废相关的查询缓存"""
+    query_cache.invalidate_notice(event)
+
+
+@EventHandler.register("meta_event", "heartbeat")
+async def wake_scheduler(event: Dict[str, Any]) -> None:
+    """心跳到达时让调度器重新检查到期任务，修正休眠或时钟跳变带来的延迟"""
+    scheduler.wake()
+
+
 # Example: Registering a handler for status events
 @EventHandler.register("status", "ok")
 async def handle_status(event: Dict[str, Any]) -> Dict[str, Any]:
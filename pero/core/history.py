@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from pero.utils.logger import logger
+
+# fetch(message_seq, count) -> 该位置之前(含)的一页消息
+PageFetcher = Callable[[Any, int], Awaitable[List[Dict[str, Any]]]]
+
+
+def message_cursor(message: Dict[str, Any]) -> Any:
+    return message.get("message_seq") or message.get("real_id") or message.get("message_id")
+
+
+async def iter_history(
+    fetch: PageFetcher,
+    start_seq: Any = 0,
+    page_size: int = 20,
+    limit: Optional[int] = None,
+    since: Optional[float] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """从新到旧逐条产出历史消息
+
+    消费当前页时已在后台请求下一页；相邻两页的边界消息会重复，只与上一页比较去重，
+    内存占用与总条数无关。
+
+    :param fetch: 获取一页消息的函数
+    :param start_seq: 起始消息序号，0 表示从最新的消息开始
+    :param page_size: 每页条数
+    :param limit: 最多产出的条数
+    :param since: 只产出该时间戳(秒)之后的消息
+    """
+    produced = 0
+    previous: Set[Any] = set()
+    pending: Optional[asyncio.Task] = asyncio.ensure_future(fetch(start_seq, page_size))
+    try:
+        while pending is not None:
+            page = await pending
+            pending = None
+            page = sorted(page, key=lambda m: (m.get("time", 0), message_cursor(m) or 0), reverse=True)
+            current = {m.get("message_id") for m in page}
+            fresh = [m for m in page if m.get("message_id") not in previous]
+            if not fresh:
+                break
+
+            # 先请求下一页，再交出本页
+            next_seq = message_cursor(page[-1])
+            if len(page) >= page_size and next_seq is not None and next_seq != start_seq:
+                pending = asyncio.ensure_future(fetch(next_seq, page_size))
+                start_seq = next_seq
+            previous = current
+
+            for message in fresh:
+                if since is not None and message.get("time", 0) < since:
+                    return
+                yield message
+                produced += 1
+                if limit is not None and produced >= limit:
+                    return
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+        logger.debug(f"History iteration finished after {produced} messages")
+
+
+def history_page_fetcher(call: Callable[..., Awaitable[Dict[str, Any]]], action: str, **target: Any) -> PageFetcher:
+    """把 get_group_msg_history / get_friend_msg_history 包装为 PageFetcher"""
+
+    async def fetch(message_seq: Any, count: int) -> List[Dict[str, Any]]:
+        params = {**target, "message_seq": message_seq, "count": count, "reverseOrder": False}
+        response = await call(action, params)
+        if response.get("status") == "failed" or response.get("retcode", 0) != 0:
+            raise RuntimeError(f"{action} failed: {response.get('message') or response.get('wording')}")
+        return (response.get("data") or {}).get("messages") or []
+
+    return fetch
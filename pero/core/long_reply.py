@@ -0,0 +1,174 @@
+import asyncio
+import re
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from pero.core.message_store import message_store
+from pero.utils.config import config_manager
+from pero.utils.logger import logger
+from pero.utils.queue import post_queue
+
+# 句末位置: 中英文句号、问号、感叹号、分号、省略号之后，或换行之后
+SENTENCE_END = re.compile(r"(?<=[。！？；…!?;])|(?<=\.\s)|(?<=\n)")
+
+Action = Tuple[str, Dict[str, Any]]
+
+
+def split_text(text: str, max_chars: int) -> Iterator[str]:
+    """按句子边界把文本切成不超过 max_chars 的片段，单个句子过长时硬切"""
+    chunk = ""
+    for sentence in SENTENCE_END.split(text):
+        if not sentence:
+            continue
+        if len(chunk) + len(sentence) <= max_chars:
+            chunk += sentence
+            continue
+        if chunk.strip():
+            yield chunk.strip()
+        while len(sentence) > max_chars:
+            yield sentence[:max_chars]
+            sentence = sentence[max_chars:]
+        chunk = sentence
+    if chunk.strip():
+        yield chunk.strip()
+
+
+class SentenceBuffer:
+    """把流式生成的文本片段攒成完整的句子
+
+    缓冲区中已有完整句子且长度达到 min_chars 时，输出到最后一个句末为止的内容；
+    超过 max_chars 仍没有句末时强制输出。
+    """
+
+    def __init__(self, min_chars: int = 20, max_chars: int = 1500):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """追加文本，返回可以发送的片段"""
+        self._buffer += delta
+        segments: List[str] = []
+        while len(self._buffer) >= self.min_chars:
+            boundary = 0
+            for match in SENTENCE_END.finditer(self._buffer, 0, self.max_chars + 1):
+                if match.start():
+                    boundary = match.start()
+            if boundary < self.min_chars:
+                if len(self._buffer) <= self.max_chars:
+                    break
+                boundary = self.max_chars
+            segment, self._buffer = self._buffer[:boundary].strip(), self._buffer[boundary:]
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def flush(self) -> str:
+        """取出剩余的文本"""
+        segment, self._buffer = self._buffer.strip(), ""
+        return segment
+
+
+class LongReply:
+    """长回复处理
+
+    超过单条长度上限的文本按句子切分后依次发送，第一段立即入队，其余按间隔入队；
+    超过转发阈值时改为在本地构造合并转发节点，一次 send_*_forward_msg 发出。
+    """
+
+    def __init__(
+        self,
+        max_chars: int = 1500,
+        forward_threshold: int = 4500,
+        interval: float = 0.8,
+        nickname: str = "pero",
+    ):
+        self.max_chars = max_chars
+        self.forward_threshold = forward_threshold
+        self.interval = interval
+        self.nickname = nickname
+        self._tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_config(cls) -> "LongReply":
+        return cls(**(config_manager.get("long_reply", {}) or {}))
+
+    def needs_split(self, text: Optional[str]) -> bool:
+        return bool(text) and len(text) > self.max_chars
+
+    def use_forward(self, text: str) -> bool:
+        return bool(self.forward_threshold) and len(text) > self.forward_threshold
+
+    def forward_payload(self, chunks: Iterable[str]) -> Dict[str, Any]:
+        """把文本片段构造为自定义合并转发节点"""
+        user_id = message_store.self_id or 0
+        nickname = message_store.self_nickname or self.nickname
+        nodes: List[Dict[str, Any]] = []
+        news: List[Dict[str, str]] = []
+        for chunk in chunks:
+            content = [{"type": "text", "data": {"text": chunk}}]
+            nodes.append({"type": "node", "data": {"user_id": user_id, "nickname": nickname, "content": content}})
+            if len(news) < 4:
+                news.append({"text": f"{nickname}: {chunk[:30]}"})
+        return {
+            "messages": nodes,
+            "source": f"{nickname}的回复",
+            "summary": f"查看{len(nodes)}条转发消息",
+            "news": news,
+        }
+
+    def send_paced(self, chunks: Iterator[str], build: Callable[[str, bool], Awaitable[Action]]):
+        """在后台依次构造并发送片段: 第一段立即发送，之后每段间隔 interval 秒
+
+        在处理器中调用时，后台任务登记为该插件的进行中任务，热重载和卸载会等待剩余片段发完
+        """
+        from pero.plugin.plugin_manager import plugin_manager
+
+        task = asyncio.create_task(self._send_paced(chunks, build))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        plugin_manager.track_background(task)
+        return task
+
+    async def send_stream(self, chunks: AsyncIterator[str], build: Callable[[str, bool], Awaitable[Action]]) -> int:
+        """按到达顺序发送流式生成的片段，相邻两段至少间隔 interval 秒，返回发送的段数"""
+        sent = 0
+        last_sent = 0.0
+        async for chunk in chunks:
+            wait = last_sent + self.interval - time.monotonic()
+            if sent and wait > 0:
+                await asyncio.sleep(wait)
+            action = await build(chunk, sent == 0)
+            if action:
+                await post_queue.put(action)
+            last_sent = time.monotonic()
+            sent += 1
+        return sent
+
+    async def _send_paced(self, chunks: Iterator[str], build: Callable[[str, bool], Awaitable[Action]]):
+        sent = 0
+        try:
+            for chunk in chunks:
+                if sent:
+                    await asyncio.sleep(self.interval)
+                action = await build(chunk, sent == 0)
+                if action:
+                    await post_queue.put(action)
+                sent += 1
+        except Exception as e:
+            logger.error(f"Error sending long reply after {sent} parts: {e}")
+
+
+long_reply = LongReply.from_config()
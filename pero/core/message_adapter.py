@@ -1,54 +1,302 @@
-from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
-from pero.core.message_parser import MessageParser
-from pero.plugin.plugin_manager import plugin_manager
+from pero.core.message_parser import ELEMENT_TYPES, Message, MessageParser
+from pero.core.waiter import message_waiter
+from pero.plugin.plugin_manager import PluginTask, current_plugin, plugin_manager
+from pero.utils.config import config_manager
 from pero.utils.logger import logger
+from pero.utils.queue import post_queue
+
+# 固定的消息段类型枚举，每种类型占用一个bit
+SEGMENT_TYPES: Tuple[str, ...] = (
+    "text",
+    "at",
+    "image",
+    "face",
+    "reply",
+    "record",
+    "video",
+    "file",
+    "json",
+    "forward",
+    "dice",
+    "rps",
+    "music",
+    "poke",
+    "markdown",
+)
+SEGMENT_BITS: Dict[str, int] = {name: 1 << i for i, name in enumerate(SEGMENT_TYPES)}
+ALL_SEGMENTS: int = (1 << len(SEGMENT_TYPES)) - 1
+
+# 处理器默认超时(秒)；LLM 回复、流式发送和防抖都可能超过半分钟。
+# 必须小于 TaskManager 处理单个事件的超时(默认 60 秒)，处理器应先于整个事件超时
+DEFAULT_HANDLER_TIMEOUT = 55.0
+
+
+def segment_mask(types: Iterable[str], strict: bool = False) -> int:
+    """将消息段类型集合编译为bitmask, strict为True时未知或解析器不记录的类型会抛出异常"""
+    mask = 0
+    for name in types:
+        bit = SEGMENT_BITS.get(name)
+        if strict and (bit is None or name not in ELEMENT_TYPES):
+            # MessageParser 不记录的类型永远不会出现在 message.types 中，按它注册的处理器不会按预期匹配
+            raise ValueError(f"Unsupported segment type: {name}, expected one of {sorted(ELEMENT_TYPES)}")
+        if bit is None:
+            continue
+        mask |= bit
+    return mask
+
+
+@dataclass
+class HandlerEntry:
+    """已注册的消息处理器"""
+
+    plugin_name: str
+    handler: Callable
+    requires: int = 0
+    excludes: int = 0
+    seq: int = 0
+    timeout: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.plugin_name}.{getattr(self.handler, '__name__', repr(self.handler))}"
+
+
+@dataclass
+class HandlerStats:
+    """单个处理器的耗时统计"""
+
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+@dataclass
+class HandlerIndex:
+    """单个消息来源(private/group)的处理器索引
+
+    普通处理器按requires掩码分桶，匹配时只枚举消息掩码的子集掩码，
+    查找次数只与消息中的段类型数量有关，与处理器数量无关。
+    """
+
+    commands: Dict[str, List[HandlerEntry]] = field(default_factory=dict)
+    buckets: Dict[int, List[HandlerEntry]] = field(default_factory=dict)
+
+    def add(self, entry: HandlerEntry, commands: Optional[List[str]] = None):
+        if commands:
+            for name in commands:
+                self.commands.setdefault(name, []).append(entry)
+        else:
+            self.buckets.setdefault(entry.requires, []).append(entry)
+
+    def without(self, plugin_names: Set[str]) -> "HandlerIndex":
+        """返回去掉指定插件处理器后的新索引，原索引不变"""
+        index = HandlerIndex()
+        for table, source in ((index.commands, self.commands), (index.buckets, self.buckets)):
+            for key, entries in source.items():
+                kept = [entry for entry in entries if entry.plugin_name not in plugin_names]
+                if kept:
+                    table[key] = kept
+        return index
+
+    def match_command(self, name: str) -> List[HandlerEntry]:
+        return list(self.commands.get(name, []))
+
+    def match(self, mask: int) -> List[HandlerEntry]:
+        matched: List[HandlerEntry] = []
+        sub = mask
+        while True:
+            for entry in self.buckets.get(sub, ()):
+                if not mask & entry.excludes:
+                    matched.append(entry)
+            if sub == 0:
+                break
+            sub = (sub - 1) & mask
+        matched.sort(key=lambda e: e.seq)
+        return matched
 
 
 class MessageAdapter:
-    handlers: Dict[str, Dict[Tuple[str], List[Tuple[str, Callable]]]] = {
-        "private": {},
-        "group": {},
+    handlers: Dict[str, HandlerIndex] = {
+        "private": HandlerIndex(),
+        "group": HandlerIndex(),
     }
+    stats: Dict[str, HandlerStats] = {}
+    _seq: int = 0
+    # 热重载期间注册的处理器先暂存，不进入路由表: (source_type, entry, commands)
+    _staged: Optional[List[Tuple[str, HandlerEntry, Optional[List[str]]]]] = None
 
     @classmethod
-    def register(cls, source_type: str, message_types: List[str], plugin_name: str) -> Callable:
+    def register(
+        cls,
+        source_type: str,
+        message_types: List[str],
+        plugin_name: str,
+        excludes: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Callable:
+        """注册消息处理器
+
+        :param source_type: 消息来源, private 或 group
+        :param message_types: 必须包含的消息段类型(仅限 ELEMENT_TYPES 中解析器记录的类型); 包含 "cmd" 时其余项为指令名
+        :param plugin_name: 插件名
+        :param excludes: 不允许出现的消息段类型; 为 None 时精确匹配(不允许出现其他类型)
+        :param timeout: 处理器超时时间(秒), 为 None 时使用配置中的 message_adapter.handler_timeout(默认 55)
+        """
+
         def decorator(handler: Callable) -> Callable:
-            key = tuple(sorted(message_types))
-            if key not in cls.handlers[source_type]:
-                cls.handlers[source_type][key] = []
-            cls.handlers[source_type][key].append((plugin_name, handler))
-            logger.info(f"Registered {source_type} message handler for types: {message_types} by plugin: {plugin_name}")
+            cls._seq += 1
+            if "cmd" in message_types:
+                commands = [name for name in message_types if name != "cmd"]
+                entry = HandlerEntry(plugin_name, handler, seq=cls._seq, timeout=timeout)
+            else:
+                commands = None
+                requires = segment_mask(message_types, strict=True)
+                if excludes is None:
+                    excluded = ALL_SEGMENTS & ~requires
+                else:
+                    excluded = segment_mask(excludes, strict=True)
+                if requires & excluded:
+                    raise ValueError(f"Segment types both required and excluded: {message_types} / {excludes}")
+                entry = HandlerEntry(
+                    plugin_name, handler, requires=requires, excludes=excluded, seq=cls._seq, timeout=timeout
+                )
+            if cls._staged is not None:
+                cls._staged.append((source_type, entry, commands))
+            else:
+                cls.handlers[source_type].add(entry, commands=commands)
+            logger.info(
+                f"Registered {source_type} message handler for types: {message_types} "
+                f"(excludes: {excludes}) by plugin: {plugin_name}"
+            )
             return handler
 
         return decorator
 
+    @classmethod
+    @contextmanager
+    def staging(cls) -> Iterator[List[Tuple[str, HandlerEntry, Optional[List[str]]]]]:
+        """暂存期间注册的处理器，供热重载在路由表之外构建新的处理器集合"""
+        staged: List[Tuple[str, HandlerEntry, Optional[List[str]]]] = []
+        cls._staged = staged
+        try:
+            yield staged
+        finally:
+            cls._staged = None
+
+    @classmethod
+    def swap_plugins(cls, plugin_names: Set[str], staged: List[Tuple[str, HandlerEntry, Optional[List[str]]]]):
+        """用暂存的处理器替换指定插件的全部处理器
+
+        新路由表构建完成后一次性替换，正在分发的消息仍使用旧表，不会看到新旧混合或重复的处理器。
+        """
+        plugin_names = set(plugin_names) | {entry.plugin_name for _, entry, _ in staged}
+        handlers = {source: index.without(plugin_names) for source, index in cls.handlers.items()}
+        for source_type, entry, commands in staged:
+            handlers.setdefault(source_type, HandlerIndex()).add(entry, commands=commands)
+        cls.handlers = handlers
+
+    @classmethod
+    def match(cls, message: Message) -> List[HandlerEntry]:
+        """查找与消息匹配的处理器"""
+        index = cls.handlers.get(message.source)
+        if index is None:
+            return []
+        if message.command:
+            return index.match_command(message.command.name)
+        return index.match(segment_mask(message.types))
+
     @classmethod
     async def handle_message(cls, event: Dict[str, Any]) -> List[Union[Tuple[str, Dict], None]]:
-        results: List[Union[Tuple[str, Dict], None]] = []
         message = await MessageParser.parse(event)
         logger.info(f"Parsed message: {message}")
 
+        # 优先交给等待该会话下一条消息的插件
+        if message_waiter.dispatch(message):
+            logger.debug(f"Message consumed by waiter: {message.session_key}")
+            return []
+
         # cmd指令
         if message.command:
             message.types = ["cmd", message.command.name]
 
-        # 插件任务
-        key: Tuple[str] = tuple(message.types)
-        handlers: List[Tuple[str, Callable]] = cls.handlers.get(message.source, {}).get(key, [])
-
-        for plugin_name, handler in handlers:
-            plugin_instance: Optional[Any] = plugin_manager.get_plugin(plugin_name)
+        # 插件任务: 所有匹配的处理器并发执行，互不影响
+        settings = config_manager.get("message_adapter", {}) or {}
+        default_timeout = settings.get("handler_timeout", DEFAULT_HANDLER_TIMEOUT)
+        tasks = []
+        for entry in cls.match(message):
+            plugin_instance: Optional[Any] = plugin_manager.get_plugin(entry.plugin_name)
             if plugin_instance:
-                try:
-                    result = await handler(plugin_instance, message)
-                    results.append(cls._ensure_valid_result(result))
-                except Exception as e:
-                    logger.error(f"Error handling message with plugin {plugin_name}: {e}")
+                timeout = entry.timeout if entry.timeout is not None else default_timeout
+                # 匹配时立即登记为插件的进行中任务: 处理器协程要到下一轮事件循环才开始执行，
+                # 期间发生的热重载也必须等待它结束
+                task = plugin_manager.track_task(entry.plugin_name)
+                tasks.append(cls._run_handler(entry, plugin_instance, message, timeout, task))
             else:
-                logger.error(f"Plugin instance for {plugin_name} not found.")
+                logger.error(f"Plugin instance for {entry.plugin_name} not found.")
 
-        return results
+        if settings.get("result_order", "registration") == "completion":
+            # 按完成顺序直接投递，快的插件不必等待慢的插件
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result:
+                    await post_queue.put(result)
+            return []
+
+        # 默认按注册顺序返回结果
+        return list(await asyncio.gather(*tasks))
+
+    @classmethod
+    async def _run_handler(
+        cls, entry: HandlerEntry, plugin_instance: Any, message: Message, timeout: Optional[float], task: PluginTask
+    ) -> Union[Tuple[str, Dict], None]:
+        """执行单个处理器，隔离超时和异常并记录耗时，结束时标记插件任务完成"""
+        stats = cls.stats.setdefault(entry.name, HandlerStats())
+        start_time = time.perf_counter()
+        # 每个处理器在 gather 创建的独立任务中运行，设置的上下文不会互相影响
+        current_plugin.set(entry.plugin_name)
+        try:
+            result = await asyncio.wait_for(entry.handler(plugin_instance, message), timeout=timeout)
+            return cls._ensure_valid_result(result)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            logger.warning(f"Handler {entry.name} timed out after {timeout}s")
+        except Exception as e:
+            stats.failures += 1
+            logger.error(f"Error handling message with plugin {entry.plugin_name}: {e}")
+        finally:
+            plugin_manager.complete_task(task)
+            elapsed = time.perf_counter() - start_time
+            stats.record(elapsed)
+            logger.debug(f"Handler {entry.name} finished in {elapsed:.3f}s")
+        return None
 
     @staticmethod
     def _ensure_valid_result(result: Any) -> Union[Tuple[str, Dict], None]:
@@ -66,9 +314,11 @@ class MessageAdapter:
         return None
 
 
-def register(scope: str, commands: list, plugin_name: str):
+def register(
+    scope: str, commands: list, plugin_name: str, excludes: Optional[list] = None, timeout: Optional[float] = None
+):
     def decorator(func):
-        MessageAdapter.register(scope, commands, plugin_name)(func)
+        MessageAdapter.register(scope, commands, plugin_name, excludes=excludes, timeout=timeout)(func)
         return func
 
     return decorator
@@ -1,8 +1,11 @@
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 from pero.core.message import At, Image, MessageElement, Text
 
+# 解析器会记录的消息段类型，其他类型的消息段会被忽略
+ELEMENT_TYPES: Dict[str, Type[MessageElement]] = {"text": Text, "at": At, "image": Image}
+
 
 class Message:
     def __init__(self):
@@ -10,6 +13,7 @@ class Message:
         self.source: Optional[str] = None
         self.reply: Optional[str] = None
         self.target: Optional[str] = None
+        self.user_id: Optional[str] = None
         self.content: Dict[str, MessageElement] = {}
         self.types: List[str] = []
         self.command: Optional[Command] = None
@@ -23,6 +27,7 @@ class Message:
             f"  source: {self.source},\n"
             f"  reply: {self.reply},\n"
             f"  target: {self.target},\n"
+            f"  user_id: {self.user_id},\n"
             f"  content: {{\n{content_str}\n  }},\n"
             f"  types: {self.types},\n"
             f"  command: {command_str}\n"
@@ -32,6 +37,11 @@ class Message:
     def get_text(self) -> str:
         return self.content.get("text").text
 
+    @property
+    def session_key(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """会话键 (来源, 目标, 用户)"""
+        return (self.source, self.target, self.user_id)
+
 
 class MessageParser:
     """消息解析器类"""
@@ -43,15 +53,10 @@ class MessageParser:
         # 解析content内容
         content = event.get("content", [])
         for i in content:
-            if i.get("type") == "text":
-                message.content["text"] = Text.from_dict(i)
-                message.types.append("text")
-            elif i.get("type") == "at":
-                message.content["at"] = At.from_dict(i)
-                message.types.append("at")
-            elif i.get("type") == "image":
-                message.content["image"] = Image.from_dict(i)
-                message.types.append("image")
+            element_cls = ELEMENT_TYPES.get(i.get("type"))
+            if element_cls is not None:
+                message.content[i["type"]] = element_cls.from_dict(i)
+                message.types.append(i["type"])
         if message.types:
             message.types = sorted(message.types)
         # 解析必要项
@@ -59,6 +64,7 @@ class MessageParser:
         message.source = event.get("source")
         message.reply = event.get("reply")
         message.target = event.get("target")
+        message.user_id = event.get("user_id")
         # 解析指令
         if "text" in message.types and message.get_text():
             # 当content中有多条内容时，比如@机器人 + 指令，此时不会被解析为指令
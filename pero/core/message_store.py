@@ -0,0 +1,322 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from pero.core.template import PreparedParams, dumps
+from pero.utils.config import config_manager
+from pero.utils.logger import logger
+
+MessageId = Union[int, str]
+
+# 与 get_msg 返回的 data 一致的字段
+RECORD_FIELDS = (
+    "message_id",
+    "message_seq",
+    "real_id",
+    "message_type",
+    "sub_type",
+    "time",
+    "self_id",
+    "user_id",
+    "group_id",
+    "target_id",
+    "sender",
+    "message",
+    "raw_message",
+    "font",
+)
+
+
+def conversation_key(message_type: Any, target: Any) -> str:
+    """会话键: (消息来源, 群号/对方QQ号)"""
+    return f"{message_type}:{target}"
+
+
+def record_conversation(record: Dict[str, Any]) -> str:
+    message_type = record.get("message_type")
+    if message_type == "group":
+        return conversation_key("group", record.get("group_id"))
+    # 私聊以对方为会话，自己发出的消息对方在 target_id 中
+    peer = record.get("target_id") if record.get("user_id") == record.get("self_id") else None
+    return conversation_key(message_type, peer or record.get("user_id"))
+
+
+class MessageStore:
+    """最近消息存储
+
+    以环形缓冲按收发顺序保存最近的消息，同时按 message_id 和会话索引，
+    超出条目数或字节预算时淘汰最早的消息。配置 spill_path 后，淘汰的消息批量写入 SQLite，
+    之后仍可按 ID 或会话查到。记录格式与 get_msg 返回的 data 相同。
+
+    记录在存入时序列化为 JSON(消息段对象转为 NapCat 格式)，读取时返回新解析的副本，
+    调用方修改返回值不会影响存储的内容。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 16 * 1024 * 1024,
+        spill_path: Optional[str] = None,
+        spill_ttl: float = 7 * 86400,
+        flush_interval: float = 5.0,
+        batch_size: int = 256,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.spill_ttl = spill_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.total_bytes = 0
+        self.self_id: Optional[int] = None
+        self.self_nickname: Optional[str] = None
+        # message_id -> (会话, json, 字节数)
+        self._messages: "OrderedDict[str, Tuple[str, str, int]]" = OrderedDict()
+        self._conversations: Dict[str, Deque[str]] = {}
+        # 等待写入 SQLite 的淘汰消息: message_id -> (会话, 存入时间, json)
+        self._spill: Dict[str, Tuple[str, float, str]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None  # 正在写入的批次
+        self._closed = False
+
+        # 统计信息
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spilled = 0
+
+    @classmethod
+    def from_config(cls) -> "MessageStore":
+        return cls(**(config_manager.get("message_store", {}) or {}))
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def add(self, record: Dict[str, Any]):
+        """保存一条消息记录，已存在的同 ID 消息会被替换"""
+        message_id = record.get("message_id")
+        if message_id is None or self.max_entries <= 0:
+            return
+        key = str(message_id)
+        if key in self._messages:
+            self._remove(key)
+        raw = dumps(record)
+        size = len(raw.encode("utf-8"))
+        conversation = record_conversation(record)
+        self._messages[key] = (conversation, raw, size)
+        self._conversations.setdefault(conversation, deque()).append(key)
+        self.total_bytes += size
+        while self._messages and (len(self._messages) > self.max_entries or self.total_bytes > self.max_bytes):
+            self._evict()
+
+    def add_event(self, event: Dict[str, Any]):
+        """保存收到的消息事件"""
+        if event.get("self_id") is not None:
+            self.self_id = event["self_id"]
+        self.add({field: event[field] for field in RECORD_FIELDS if field in event})
+
+    def add_sent(self, message_id: MessageId, action: str, params: Dict[str, Any]):
+        """保存自己发出的消息，params 为实际发送的 send_*_msg 请求参数(本地媒体已替换)"""
+        if isinstance(params, PreparedParams):
+            params = json.loads(params.raw)
+        if action == "send_msg":
+            message_type = params.get("message_type") or ("group" if params.get("group_id") else "private")
+        else:
+            message_type = "group" if action == "send_group_msg" else "private"
+        record = {
+            "message_id": message_id,
+            "message_type": message_type,
+            "time": int(time.time()),
+            "self_id": self.self_id,
+            "user_id": self.self_id,
+            "sender": {"user_id": self.self_id, "nickname": self.self_nickname or ""},
+            "message": params.get("message"),
+        }
+        if message_type == "group":
+            record["group_id"] = params.get("group_id")
+        else:
+            record["target_id"] = params.get("user_id")
+        self.add(record)
+
+    def set_self(self, user_id: Optional[int], nickname: Optional[str]):
+        """记录机器人自身的 QQ 号和昵称，用于自己发出的消息"""
+        if user_id is not None:
+            self.self_id = user_id
+        self.self_nickname = nickname or ""
+
+    def peek(self, message_id: MessageId) -> Optional[Dict[str, Any]]:
+        """只在内存中查找消息"""
+        entry = self._messages.get(str(message_id))
+        return json.loads(entry[1]) if entry else None
+
+    async def get(self, message_id: MessageId) -> Optional[Dict[str, Any]]:
+        """按 ID 查找消息，依次查询内存和 SQLite"""
+        key = str(message_id)
+        entry = self._messages.get(key)
+        if entry is not None:
+            self.hits += 1
+            return json.loads(entry[1])
+        if self.spill_path:
+            if key in self._spill:
+                self.spill_hits += 1
+                return json.loads(self._spill[key][2])
+            row = await self._run(self._db_get, key)
+            if row is not None:
+                self.spill_hits += 1
+                return json.loads(row[0])
+        self.misses += 1
+        return None
+
+    async def recent(self, message_type: str, target: Any, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取会话中最近的消息，按时间从早到晚排列"""
+        conversation = conversation_key(message_type, target)
+        keys = self._conversations.get(conversation, ())
+        records = [json.loads(self._messages[key][1]) for key in list(keys)[-limit:]]
+        if len(records) < limit and self.spill_path:
+            await self.flush()
+            rows = await self._run(self._db_recent, conversation, limit - len(records))
+            records = [json.loads(row[0]) for row in reversed(rows)] + records
+        return records
+
+    async def flush(self):
+        """将淘汰的消息写入 SQLite"""
+        if not self._spill:
+            return
+        spill, self._spill = self._spill, {}
+        # 批次已从队列取出，写入不随调用方取消而中断，否则这批消息会丢失
+        self._writing = asyncio.ensure_future(self._write_batch(spill))
+        await asyncio.shield(self._writing)
+
+    async def _write_batch(self, spill: Dict[str, Tuple[str, float, str]]):
+        rows = [(key, conversation, stored_at, raw) for key, (conversation, stored_at, raw) in spill.items()]
+        try:
+            await self._run(self._db_write, rows)
+        except Exception as e:
+            for key, item in spill.items():
+                self._spill.setdefault(key, item)
+            logger.error(f"Failed to spill messages: {e}")
+            return
+        self.spilled += len(rows)
+
+    async def close(self):
+        """停止后台写入任务，写入剩余的淘汰消息"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        if self._writing is not None:
+            await self._writing
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.spill_hits + self.misses
+        return {
+            "entries": len(self._messages),
+            "bytes": self.total_bytes,
+            "conversations": len(self._conversations),
+            "hits": self.hits,
+            "spill_hits": self.spill_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.spill_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "spilled": self.spilled,
+        }
+
+    def _remove(self, key: str) -> Tuple[str, str]:
+        conversation, raw, size = self._messages.pop(key)
+        self.total_bytes -= size
+        keys = self._conversations.get(conversation)
+        if keys:
+            if keys[0] == key:
+                keys.popleft()
+            else:
+                keys.remove(key)
+            if not keys:
+                del self._conversations[conversation]
+        return conversation, raw
+
+    def _evict(self):
+        key = next(iter(self._messages))
+        conversation, raw = self._remove(key)
+        self.evictions += 1
+        if self.spill_path and not self._closed:
+            self._spill[key] = (conversation, time.time(), raw)
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._spill and not self._closed:
+            if len(self._spill) < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="message-store")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # 以下方法只在 message-store 线程中执行
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.spill_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.spill_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (message_id TEXT PRIMARY KEY, "
+                "conversation TEXT NOT NULL, stored_at REAL NOT NULL, record TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS messages_conversation ON messages (conversation, stored_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _db_get(self, key: str) -> Optional[Tuple[str]]:
+        return self._connect().execute("SELECT record FROM messages WHERE message_id = ?", (key,)).fetchone()
+
+    def _db_recent(self, conversation: str, limit: int) -> List[Tuple[str]]:
+        return (
+            self._connect()
+            .execute(
+                "SELECT record FROM messages WHERE conversation = ? ORDER BY stored_at DESC LIMIT ?",
+                (conversation, limit),
+            )
+            .fetchall()
+        )
+
+    def _db_write(self, rows: List[Tuple[str, str, float, str]]):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO messages (message_id, conversation, stored_at, record) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if self.spill_ttl:
+                conn.execute("DELETE FROM messages WHERE stored_at < ?", (time.time() - self.spill_ttl,))
+
+
+message_store = MessageStore.from_config()
@@ -0,0 +1,104 @@
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from pero.utils.cache import LRUCache
+from pero.utils.config import config_manager
+from pero.utils.logger import logger
+
+# 可缓存的只读查询: 动作 -> (TTL 秒, 最大条目数)
+DEFAULT_POLICIES: Dict[str, Tuple[float, int]] = {
+    "get_login_info": (3600.0, 1),
+    "get_friend_list": (300.0, 1),
+    "get_stranger_info": (600.0, 1024),
+    "get_group_info": (300.0, 256),
+    "get_group_member_info": (300.0, 4096),
+    "get_group_member_list": (120.0, 128),
+}
+
+
+class QueryCache:
+    """NapCat 只读查询的 TTL 缓存
+
+    每个动作使用独立的 LRU 缓存和 TTL，只缓存成功的响应。
+    群成员变动、群名片、管理员变更、新好友等通知事件到达时作废相关条目。
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Any]] = None):
+        self.caches: Dict[str, LRUCache] = {}
+        merged = dict(DEFAULT_POLICIES)
+        for action, policy in (policies or {}).items():
+            if isinstance(policy, dict):
+                ttl, max_entries = merged.get(action, (60.0, 256))
+                policy = (policy.get("ttl", ttl), policy.get("max_entries", max_entries))
+            merged[action] = tuple(policy)
+        for action, (ttl, max_entries) in merged.items():
+            if ttl and max_entries:
+                self.caches[action] = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.invalidations = 0
+
+    @classmethod
+    def from_config(cls) -> "QueryCache":
+        return cls(config_manager.get("query_cache", {}) or {})
+
+    @staticmethod
+    def _key(params: Optional[Dict[str, Any]]) -> Hashable:
+        if not params:
+            return ()
+        return tuple(sorted((key, str(value)) for key, value in params.items() if key != "no_cache"))
+
+    def cacheable(self, action: str, params: Optional[Dict[str, Any]] = None) -> bool:
+        return action in self.caches and not (params or {}).get("no_cache")
+
+    def get(self, action: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """查询缓存的响应，未命中返回 None"""
+        if not self.cacheable(action, params):
+            return None
+        return self.caches[action].get(self._key(params))
+
+    def set(self, action: str, params: Optional[Dict[str, Any]], response: Dict[str, Any]):
+        """缓存成功的响应，no_cache 请求取回的新数据同样写入"""
+        if action not in self.caches:
+            return
+        if response.get("status") == "failed" or response.get("retcode", 0) != 0:
+            return
+        self.caches[action].set(self._key(params), response)
+
+    def invalidate(self, action: str, **params: Any):
+        cache = self.caches.get(action)
+        if cache is not None and cache.pop(self._key(params)) is not None:
+            self.invalidations += 1
+
+    def invalidate_notice(self, event: Dict[str, Any]):
+        """根据通知事件作废相关缓存"""
+        notice_type = event.get("notice_type")
+        group_id, user_id = event.get("group_id"), event.get("user_id")
+        if notice_type == "friend_add":
+            self.invalidate("get_friend_list")
+            self.invalidate("get_stranger_info", user_id=user_id)
+            return
+        if group_id is None:
+            return
+        self.invalidate("get_group_member_list", group_id=group_id)
+        if user_id is not None:
+            self.invalidate("get_group_member_info", group_id=group_id, user_id=user_id)
+        if notice_type in ("group_increase", "group_decrease"):
+            # 成员数变化
+            self.invalidate("get_group_info", group_id=group_id)
+        logger.debug(f"Query cache invalidated by {notice_type}: group={group_id}, user={user_id}")
+
+    def clear(self):
+        for cache in self.caches.values():
+            cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        hits = sum(cache.hits for cache in self.caches.values())
+        misses = sum(cache.misses for cache in self.caches.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "invalidations": self.invalidations,
+            "actions": {action: cache.stats() for action, cache in self.caches.items()},
+        }
+
+
+query_cache = QueryCache.from_config()
@@ -0,0 +1,385 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from pero.utils.config import config_manager
+from pero.utils.logger import logger
+
+OVERLAP_POLICIES = ("skip", "allow", "queue")
+MISSED_POLICIES = ("skip", "run_once")
+
+
+class CronExpression:
+    """五段式 cron 表达式: 分 时 日 月 周，支持 *、*/n、a-b、a-b/n 和逗号列表，周日为 0 或 7"""
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression: {expr}")
+        self.expr = expr
+        parsed = [self._parse(value, low, high) for value, (low, high) in zip(fields, self.RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {day % 7 for day in weekdays}
+        # 日和周都被限定时，满足其一即可(与 crontab 一致)
+        self.days_restricted = fields[2] != "*"
+        self.weekdays_restricted = fields[4] != "*"
+
+    @staticmethod
+    def _parse(value: str, low: int, high: int) -> Set[int]:
+        result: Set[int] = set()
+        for part in value.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(x) for x in part.split("-", 1))
+            else:
+                start = end = int(part)
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Cron field out of range: {value}")
+            result.update(range(start, end + 1, step))
+        return result
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        """dt 之后(不含)的下一个触发时间"""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"Cron expression never fires: {self.expr}")
+
+    def __repr__(self) -> str:
+        return f"CronExpression({self.expr!r})"
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0  # 上一次仍在运行而跳过
+    missed: int = 0  # 错过触发时间而跳过
+    total_lateness: float = 0.0
+    max_lateness: float = 0.0
+    total_duration: float = 0.0
+    max_duration: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "missed": self.missed,
+            "avg_lateness": self.total_lateness / self.runs if self.runs else 0.0,
+            "max_lateness": self.max_lateness,
+            "avg_duration": self.total_duration / self.runs if self.runs else 0.0,
+            "max_duration": self.max_duration,
+        }
+
+
+@dataclass
+class Job:
+    """调度任务
+
+    interval 和 cron 二选一。overlap 决定上一次仍在运行时的行为: skip 跳过、allow 并行、queue 排队；
+    missed 决定错过触发时间(重启或事件循环阻塞超过 grace_time)时的行为: skip 跳过、run_once 补跑一次。
+    scheduled 是不含随机延迟的名义触发时间，后续触发时间和延迟统计都以它为准；next_run 是加上 jitter 后的实际触发时间。
+    """
+
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval: Optional[float] = None
+    cron: Optional[CronExpression] = None
+    jitter: float = 0.0
+    overlap: str = "skip"
+    missed: str = "run_once"
+    grace_time: float = 60.0
+    scheduled: float = 0.0
+    next_run: float = 0.0
+    last_run: Optional[float] = None
+    stats: JobStats = field(default_factory=JobStats)
+    tasks: Set[asyncio.Task] = field(default_factory=set)
+    version: int = 0
+
+    def next_fire(self, after: float, scheduled: Optional[float] = None) -> float:
+        """after 之后的下一次名义触发时间(不含 jitter); 固定间隔任务保持原有相位，不随执行耗时漂移"""
+        if self.cron is not None:
+            return self.cron.next_after(datetime.fromtimestamp(after)).timestamp()
+        base = scheduled if scheduled is not None else after
+        periods = max(1, int((after - base) // self.interval) + 1)
+        return base + periods * self.interval
+
+
+class Scheduler:
+    """中心调度器
+
+    所有任务的下次触发时间放在一个最小堆中，由单个协程按时间顺序触发，
+    上次运行时间持久化到 JSON 文件，重启后按错过策略决定是否补跑。
+    """
+
+    def __init__(self, state_path: str = "data/scheduler.json"):
+        self.state_path = state_path
+        self.jobs: Dict[str, Job] = {}
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._counter = itertools.count()
+        # 版本号在整个调度器内递增: 任务被移除后同名任务重新加入时，堆中的旧条目也不会被当作有效条目
+        self._versions = itertools.count(1)
+        self._last_runs: Dict[str, float] = self._load_state()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._save_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls) -> "Scheduler":
+        return cls(**(config_manager.get("scheduler", {}) or {}))
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: Union[float, timedelta, None] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0.0,
+        overlap: str = "skip",
+        missed: str = "run_once",
+        grace_time: float = 60.0,
+    ) -> Job:
+        """添加或替换任务，interval 和 cron 二选一"""
+        if (interval is None) == (cron is None):
+            raise ValueError("Exactly one of interval or cron is required")
+        if overlap not in OVERLAP_POLICIES or missed not in MISSED_POLICIES:
+            raise ValueError(f"Unknown policy: overlap={overlap}, missed={missed}")
+        if isinstance(interval, timedelta):
+            interval = interval.total_seconds()
+        if interval is not None and interval <= 0:
+            raise ValueError("Interval must be positive")
+
+        old = self.jobs.get(name)
+        job = Job(
+            name,
+            func,
+            interval=interval,
+            cron=CronExpression(cron) if cron else None,
+            jitter=jitter,
+            overlap=overlap,
+            missed=missed,
+            grace_time=grace_time,
+            last_run=self._last_runs.get(name),
+            version=next(self._versions),
+        )
+        if old is not None:
+            job.stats = old.stats
+        self.jobs[name] = job
+        self._push(job, self._first_fire(job, time.time()))
+        self._ensure_started()
+        return job
+
+    def remove_job(self, name: str, cancel: bool = False):
+        """移除任务，堆中的旧条目在弹出时被忽略"""
+        job = self.jobs.pop(name, None)
+        if job is not None and cancel:
+            for task in job.tasks:
+                task.cancel()
+
+    def _first_fire(self, job: Job, now: float) -> float:
+        if job.last_run is None:
+            # 从未运行过: 固定间隔任务立即运行一次，cron 任务等到下一个触发时间
+            return now if job.interval is not None else job.next_fire(now)
+        due = job.next_fire(job.last_run, scheduled=job.last_run)
+        if due >= now:
+            return due
+        if job.missed == "run_once":
+            logger.info(f"Scheduled job {job.name} missed its run at {datetime.fromtimestamp(due)}, running now")
+            return now
+        job.stats.missed += 1
+        return job.next_fire(now, scheduled=job.last_run)
+
+    def _push(self, job: Job, scheduled: float):
+        """按名义触发时间安排任务，随机延迟只加在入堆的实际触发时间上，不累积到相位中"""
+        job.scheduled = scheduled
+        job.next_run = scheduled + (random.uniform(0, job.jitter) if job.jitter else 0.0)
+        heapq.heappush(self._heap, (job.next_run, next(self._counter), job.version, job.name))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 没有运行中的事件循环，等待 start() 调用
+        self.start()
+
+    def start(self):
+        """启动调度循环"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    def wake(self):
+        """立即重新检查堆顶，系统时钟跳变或休眠恢复后调用"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            if not self._heap:
+                await self._wait(None)
+                continue
+            fire_at, _, version, name = self._heap[0]
+            delay = fire_at - time.time()
+            if delay > 0:
+                await self._wait(delay)
+                continue
+            heapq.heappop(self._heap)
+            job = self.jobs.get(name)
+            if job is None or job.version != version:
+                continue
+            self._fire(job)
+
+    async def _wait(self, timeout: Optional[float]):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _fire(self, job: Job):
+        now = time.time()
+        scheduled = job.scheduled
+        lateness = now - scheduled
+        # 先安排下一次，执行耗时不影响后续触发时间
+        self._push(job, job.next_fire(now, scheduled=scheduled))
+
+        # 延迟从名义时间算起，随机延迟本身不算错过
+        if lateness > job.grace_time + job.jitter and job.missed == "skip":
+            job.stats.missed += 1
+            logger.warning(f"Scheduled job {job.name} is {lateness:.1f}s late, skipped")
+            return
+        running = {task for task in job.tasks if not task.done()}
+        if running and job.overlap == "skip":
+            job.stats.skipped += 1
+            logger.warning(f"Scheduled job {job.name} is still running, skipped")
+            return
+        previous = running if job.overlap == "queue" else set()
+        task = asyncio.create_task(self._run(job, lateness, previous))
+        job.tasks.add(task)
+        task.add_done_callback(job.tasks.discard)
+
+    async def _run(self, job: Job, lateness: float, previous: Set[asyncio.Task]):
+        if previous:
+            await asyncio.wait(previous)
+        start = time.time()
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.stats.failures += 1
+            logger.error(f"Scheduled job {job.name} failed: {e}")
+        finally:
+            duration = time.time() - start
+            stats = job.stats
+            stats.runs += 1
+            stats.total_lateness += lateness
+            stats.max_lateness = max(stats.max_lateness, lateness)
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+            job.last_run = start
+            self._last_runs[job.name] = start
+            self._schedule_save()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "next_run": job.next_run,
+                "last_run": job.last_run,
+                "running": sum(not task.done() for task in job.tasks),
+                **job.stats.to_dict(),
+            }
+            for name, job in self.jobs.items()
+        }
+
+    async def close(self, timeout: float = 10.0):
+        """停止调度循环，等待运行中的任务结束并保存上次运行时间"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        running = {task for job in self.jobs.values() for task in job.tasks if not task.done()}
+        if running:
+            _, pending = await asyncio.wait(running, timeout=timeout)
+            for task in pending:
+                task.cancel()
+        if self._save_task is not None:
+            await asyncio.gather(self._save_task, return_exceptions=True)
+        self._save_state(dict(self._last_runs))
+
+    # 上次运行时间的持久化
+    def _load_state(self) -> Dict[str, float]:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return {name: float(value) for name, value in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load scheduler state {self.state_path}: {e}")
+            return {}
+
+    def _save_state(self, state: Dict[str, float]):
+        try:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.warning(f"Failed to save scheduler state: {e}")
+
+    def _schedule_save(self):
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_soon())
+
+    async def _save_soon(self):
+        # 合并短时间内的多次写入
+        await asyncio.sleep(1.0)
+        await asyncio.get_running_loop().run_in_executor(None, self._save_state, dict(self._last_runs))
+
+
+scheduler = Scheduler.from_config()
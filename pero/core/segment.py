@@ -0,0 +1,53 @@
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+
+class Segment(Mapping):
+    """消息段的紧凑表示
+
+    只保存 type 和 data 两个槽位，同时实现只读映射接口，
+    原先按字典访问消息段的代码(seg["type"]、seg["data"]["text"]、seg.get(...))无需修改。
+    序列化为 NapCat 格式只在发送时进行一次。
+    """
+
+    __slots__ = ("type", "data")
+
+    def __init__(self, type: str, data: Optional[Dict[str, Any]] = None):
+        self.type = type
+        self.data = data
+
+    @classmethod
+    def from_dict(cls, segment: Mapping) -> "Segment":
+        if isinstance(segment, Segment):
+            return segment
+        return cls(segment["type"], segment.get("data"))
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "type":
+            return self.type
+        if key == "data" and self.data is not None:
+            return self.data
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        yield "type"
+        if self.data is not None:
+            yield "data"
+
+    def __len__(self) -> int:
+        return 1 if self.data is None else 2
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.data is None:
+            return {"type": self.type}
+        return {"type": self.type, "data": self.data}
+
+    def __repr__(self) -> str:
+        return f"Segment({self.type!r}, {self.data!r})"
+
+
+def json_default(obj: Any) -> Any:
+    """json.dumps 的 default 钩子，将消息段序列化为 NapCat 格式"""
+    if isinstance(obj, Segment):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
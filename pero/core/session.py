@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pero.utils.cache import LRUCache
+from pero.utils.config import config_manager
+from pero.utils.logger import logger
+
+SessionKey = Union[str, Tuple[Any, Any, Any]]
+
+_DELETED = object()
+
+
+def make_session_key(source: Any, target: Any, user: Any) -> str:
+    """会话键: (消息来源, 目标群/好友, 用户)"""
+    return f"{source}:{target}:{user}"
+
+
+class SessionStore:
+    """会话存储
+
+    内存层是带 TTL 的 LRU 缓存，后端是 WAL 模式的 SQLite。
+    写入先进入内存和待写队列，由后台任务批量落盘(write-behind)，
+    所有 SQLite 操作都在单独的线程中执行，不阻塞事件循环。
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data/sessions.db",
+        max_entries: int = 4096,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl: float = 1800.0,
+        flush_interval: float = 2.0,
+        batch_size: int = 256,
+    ):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        self._pending: Dict[str, Any] = {}  # 等待落盘的写入/删除: key -> (value, json) 或 _DELETED
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-db")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_event: Optional[asyncio.Event] = None
+        self._writing: Optional[asyncio.Future] = None  # 正在写入的批次
+        self._closed = False
+
+        # 统计信息
+        self.db_reads = 0
+        self.db_writes = 0
+        self.flushes = 0
+
+    @classmethod
+    def from_config(cls) -> "SessionStore":
+        return cls(**(config_manager.get("session", {}) or {}))
+
+    @staticmethod
+    def _normalize(key: SessionKey) -> str:
+        if isinstance(key, tuple):
+            return make_session_key(*key)
+        return str(key)
+
+    async def get(self, key: SessionKey, default: Any = None) -> Any:
+        """读取会话数据，依次查询待写队列、内存层和 SQLite"""
+        key = self._normalize(key)
+        if key in self._pending:
+            pending = self._pending[key]
+            return default if pending is _DELETED else pending[0]
+
+        value = self._cache.get(key, _DELETED)
+        if value is not _DELETED:
+            return value
+
+        row = await self._run(self._db_get, key)
+        self.db_reads += 1
+        if row is None:
+            return default
+        raw, size = row
+        # 读库期间可能已有新的写入，以新写入为准
+        if key in self._pending:
+            pending = self._pending[key]
+            return default if pending is _DELETED else pending[0]
+        value = json.loads(raw)
+        self._cache.set(key, value, size=size)
+        return value
+
+    async def set(self, key: SessionKey, value: Any):
+        """写入会话数据(值需可 JSON 序列化)，延迟批量落盘"""
+        key = self._normalize(key)
+        raw = json.dumps(value, ensure_ascii=False)
+        self._cache.set(key, value, size=len(raw.encode("utf-8")))
+        self._pending[key] = (value, raw)
+        self._schedule_flush()
+
+    async def delete(self, key: SessionKey):
+        key = self._normalize(key)
+        self._cache.pop(key)
+        self._pending[key] = _DELETED
+        self._schedule_flush()
+
+    async def flush(self):
+        """将待写队列写入 SQLite"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        # 批次已从待写队列取出，写入不随调用方取消而中断，否则这批数据会丢失
+        self._writing = asyncio.ensure_future(self._write_batch(pending))
+        await asyncio.shield(self._writing)
+
+    async def _write_batch(self, pending: Dict[str, Any]):
+        upserts: List[Tuple[str, str, int, float]] = []
+        deletes: List[Tuple[str]] = []
+        now = time.time()
+        for key, item in pending.items():
+            if item is _DELETED:
+                deletes.append((key,))
+            else:
+                raw = item[1]
+                upserts.append((key, raw, len(raw.encode("utf-8")), now))
+        try:
+            await self._run(self._db_write, upserts, deletes)
+        except Exception as e:
+            # 写入失败时放回队列，保留期间的新写入
+            for key, item in pending.items():
+                self._pending.setdefault(key, item)
+            logger.error(f"Failed to flush sessions: {e}")
+            return
+        self.db_writes += len(upserts) + len(deletes)
+        self.flushes += 1
+
+    async def close(self):
+        """停止后台落盘任务并写入剩余数据"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        if self._writing is not None:
+            await self._writing
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+        logger.info("Session store closed.")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self._cache.stats(),
+            "pending": len(self._pending),
+            "db_reads": self.db_reads,
+            "db_writes": self.db_writes,
+            "flushes": self.flushes,
+        }
+
+    def _schedule_flush(self):
+        if self._closed:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if len(self._pending) >= self.batch_size:
+            self._flush_event.set()
+
+    async def _flush_loop(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            await self.flush()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # 以下方法只在 session-db 线程中执行
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, int]]:
+        return self._connect().execute("SELECT value, size FROM sessions WHERE key = ?", (key,)).fetchone()
+
+    def _db_write(self, upserts: List[Tuple[str, str, int, float]], deletes: List[Tuple[str]]):
+        conn = self._connect()
+        with conn:
+            if upserts:
+                conn.executemany(
+                    "INSERT INTO sessions (key, value, size, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                    "updated_at = excluded.updated_at",
+                    upserts,
+                )
+            if deletes:
+                conn.executemany("DELETE FROM sessions WHERE key = ?", deletes)
+
+
+session_store = SessionStore.from_config()
@@ -86,7 +86,8 @@ class TaskManager:
         try:
             return await asyncio.wait_for(self.handle_event(event), timeout=task_info.timeout)
         except asyncio.TimeoutError:
-            if task_info.retries < task_info.max_retries:
+            # 消息事件的处理器各自有超时，整体重试会让已经回复过的处理器重复回复
+            if event.get("post_type") != "message" and task_info.retries < task_info.max_retries:
                 task_info.retries += 1
                 logger.warning(f"Task timeout, retrying ({task_info.retries}/{task_info.max_retries})")
                 return await self._handle_event_with_timeout(event)
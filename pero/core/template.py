@@ -0,0 +1,107 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from pero.core.segment import json_default
+from pero.utils.media import media_encoder
+
+# 消息来源 -> (发送动作, 目标字段)
+SEND_ACTIONS = {
+    "group": ("send_group_msg", "group_id"),
+    "private": ("send_private_msg", "user_id"),
+}
+
+
+def dumps(obj: Any) -> str:
+    """与发送端一致的紧凑 JSON 序列化"""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=json_default)
+
+
+class Slot(str):
+    """模板中的可变文本槽位，发送时以同名关键字参数填充; 未渲染时显示为 {name}"""
+
+    def __new__(cls, name: str):
+        slot = super().__new__(cls, f"{{{name}}}")
+        slot.name = name
+        return slot
+
+    def __repr__(self) -> str:
+        return f"Slot({self.name!r})"
+
+
+class PreparedParams(dict):
+    """已序列化的请求参数
+
+    dict 内容只保留目标字段用于日志和队列类型检查，发送时直接使用 raw 中的 JSON 文本。
+    """
+
+    def __init__(self, raw: str, **preview):
+        super().__init__(**preview)
+        self.raw = raw
+
+
+class MessageTemplate:
+    """预序列化的消息模板
+
+    静态消息段在 prepare 时只序列化一次，发送时只拼接目标、回复和文本槽位。
+    """
+
+    def __init__(self, source: str, fragments: List[Union[str, Slot]]):
+        if source not in SEND_ACTIONS:
+            raise ValueError(f"Unknown source type: {source}")
+        self.source = source
+        self.action, self.target_key = SEND_ACTIONS[source]
+        self.fragments = fragments
+        self.slots = [fragment.name for fragment in fragments if isinstance(fragment, Slot)]
+
+    @classmethod
+    async def build(cls, elements: list, source: str = "group") -> "MessageTemplate":
+        """序列化消息段，本地媒体文件在此时一次性编码
+
+        path 模式下模板引用的是共享目录中的文件，渲染时不会刷新其使用时间，因此固定这些文件不被回收。
+        """
+        params, usage = await media_encoder.resolve({"message": list(elements)}, use_refs=False)
+        media_encoder.pin(usage.spooled)
+        fragments: List[Union[str, Slot]] = []
+        static: List[str] = []
+        for i, element in enumerate(params["message"]):
+            prefix = "," if i else ""
+            text = element.get("data", {}).get("text") if element.get("type") == "text" else None
+            if isinstance(text, Slot):
+                static.append(prefix + '{"type":"text","data":{"text":')
+                fragments.append("".join(static))
+                fragments.append(text)
+                static = ["}}"]
+            else:
+                static.append(prefix + dumps(element))
+        fragments.append("".join(static))
+        return cls(source, fragments)
+
+    def render(
+        self, target: Union[int, str], reply: Optional[Union[int, str]] = None, **slots: Any
+    ) -> Tuple[str, PreparedParams]:
+        """填充可变字段，返回可以直接交给 post_queue 的 (action, params)"""
+        parts = [f'{{"{self.target_key}":', dumps(target), ',"message":[']
+        if reply:
+            parts.append('{"type":"reply","data":{"id":')
+            parts.append(dumps(str(reply)))
+            parts.append("}}")
+            if self.fragments != [""]:
+                parts.append(",")
+        for fragment in self.fragments:
+            if isinstance(fragment, Slot):
+                parts.append(dumps(str(slots.get(fragment.name, ""))))
+            else:
+                parts.append(fragment)
+        parts.append("]}")
+        return f"/{self.action}", PreparedParams("".join(parts), **{self.target_key: target})
+
+    def render_for(self, message, **slots: Any) -> Tuple[str, PreparedParams]:
+        """以消息对象的目标和回复 ID 填充模板"""
+        return self.render(message.target, reply=message.reply, **slots)
+
+
+def encode_frame(action: str, params: Optional[Dict], echo: str) -> str:
+    """组装发送给 NapCat 的完整 JSON 帧，预序列化的参数直接拼接"""
+    if isinstance(params, PreparedParams):
+        return f'{{"action":{dumps(action)},"params":{params.raw},"echo":{dumps(echo)}}}'
+    return dumps({"action": action, "params": params, "echo": echo})
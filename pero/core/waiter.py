@@ -0,0 +1,93 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pero.core.message_parser import Message
+from pero.utils.logger import logger
+
+Predicate = Callable[[Message], bool]
+
+
+@dataclass
+class Waiter:
+    future: asyncio.Future
+    predicate: Optional[Predicate] = None
+
+
+class MessageWaiter:
+    """等待同一会话中的下一条消息
+
+    等待者按会话键 (来源, 目标, 用户) 存放在字典中，新消息到达时只需一次字典查找，
+    超时或取消后自动清理。
+    """
+
+    def __init__(self):
+        self._waiters: Dict[Tuple, List[Waiter]] = {}
+
+        # 统计信息
+        self.created = 0
+        self.resolved = 0
+        self.timed_out = 0
+
+    async def wait(
+        self, message: Message, timeout: Optional[float] = 45.0, predicate: Optional[Predicate] = None
+    ) -> Optional[Message]:
+        """等待与 message 同一会话的下一条消息，超时返回 None
+
+        注意处理器本身受 message_adapter.handler_timeout(默认 55 秒)限制，timeout 应小于该值，
+        默认值留出 10 秒用于处理等到的消息。
+        """
+        key = message.session_key
+        waiter = Waiter(asyncio.get_running_loop().create_future(), predicate)
+        self._waiters.setdefault(key, []).append(waiter)
+        self.created += 1
+        try:
+            return await asyncio.wait_for(waiter.future, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return None
+        finally:
+            self._remove(key, waiter)
+
+    def dispatch(self, message: Message) -> bool:
+        """将消息交给等待中的协程，被消费时返回 True"""
+        waiters = self._waiters.get(message.session_key)
+        if not waiters:
+            return False
+        for waiter in waiters:
+            if waiter.future.done():
+                continue
+            if waiter.predicate is not None:
+                try:
+                    if not waiter.predicate(message):
+                        continue
+                except Exception as e:
+                    logger.error(f"Error in wait_next predicate: {e}")
+                    continue
+            waiter.future.set_result(message)
+            self.resolved += 1
+            return True
+        return False
+
+    def _remove(self, key: Tuple, waiter: Waiter):
+        waiters = self._waiters.get(key)
+        if not waiters:
+            return
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiters[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": sum(len(waiters) for waiters in self._waiters.values()),
+            "conversations": len(self._waiters),
+            "created": self.created,
+            "resolved": self.resolved,
+            "timed_out": self.timed_out,
+        }
+
+
+message_waiter = MessageWaiter()
@@ -1,16 +1,69 @@
 import asyncio
-import datetime
+import itertools
 import json
-from typing import Dict
+from typing import Any, Dict, Optional, Tuple, Union
 
 import websockets
 
+from pero.core.message_store import message_store
+from pero.core.template import dumps, encode_frame
 from pero.utils.logger import logger
+from pero.utils.media import MediaUsage, media_encoder
 from pero.utils.queue import post_queue, recv_queue
 
+# 发送消息的动作: 响应中的 message_id 用于记录发出的消息和取回媒体引用
+SEND_MSG_ACTIONS = {"send_group_msg", "send_private_msg", "send_msg"}
+
+# 无副作用的查询动作: 参数相同且已有请求在途时共享同一个响应
+COALESCE_ACTIONS = frozenset(
+    {
+        "can_send_image",
+        "can_send_record",
+        "fetch_custom_face",
+        "fetch_emoji_like",
+        "get_ai_characters",
+        "get_cookies",
+        "get_credentials",
+        "get_csrf_token",
+        "get_essence_msg_list",
+        "get_file",
+        "get_forward_msg",
+        "get_friend_list",
+        "get_friend_msg_history",
+        "get_friends_with_category",
+        "get_group_at_all_remain",
+        "get_group_file_system_info",
+        "get_group_file_url",
+        "get_group_files_by_folder",
+        "get_group_honor_info",
+        "get_group_ignored_notifies",
+        "get_group_info",
+        "get_group_info_ex",
+        "get_group_list",
+        "get_group_member_info",
+        "get_group_member_list",
+        "get_group_msg_history",
+        "get_group_root_files",
+        "get_group_shut_list",
+        "get_group_system_msg",
+        "get_image",
+        "get_login_info",
+        "get_msg",
+        "get_profile_like",
+        "get_recent_contact",
+        "get_record",
+        "get_robot_uin_range",
+        "get_status",
+        "get_stranger_info",
+        "get_version_info",
+    }
+)
+
 
 class WebSocketClient:
-    def __init__(self, uri: str, retry_interval: int = 5):
+    instance: Optional["WebSocketClient"] = None
+
+    def __init__(self, uri: str, retry_interval: int = 5, call_timeout: float = 30.0):
         self.uri = uri
         self.websocket = None
         self.is_connected = False
@@ -18,6 +71,17 @@ class WebSocketClient:
         self.receive_lock = asyncio.Lock()
         self.retry_interval = retry_interval
         self.heartbeat_interval = 30
+        self.call_timeout = call_timeout
+        # echo -> 等待响应的 future
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._echo_counter = itertools.count(1)
+        self._login_info_requested = False
+        # (action, params) -> 在途的查询请求
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.coalesced = 0
+        WebSocketClient.instance = self
+        # NapCat 在本机时改为发送共享目录中的文件引用
+        media_encoder.configure_transport(uri)
 
     async def __aenter__(self):
         """进入异步上下文管理器"""
@@ -66,14 +130,14 @@ class WebSocketClient:
         response = await self.websocket.recv()
         logger.debug(f"Received Lifecycle Event: {response}")
 
-    async def send(self, msg: Dict[str, str]):
-        """发送消息到 WebSocket 服务端"""
+    async def send(self, msg: Union[Dict[str, Any], str]):
+        """发送消息到 WebSocket 服务端，已编码的 JSON 文本直接发送"""
         async with self.send_lock:
             if not self.websocket:
                 logger.error("WebSocket not connected.")
                 return
             try:
-                await self.websocket.send(json.dumps(msg))
+                await self.websocket.send(msg if isinstance(msg, str) else dumps(msg))
                 logger.debug(f"Sent: {msg}")
             except Exception as e:
                 logger.error(f"Error sending message: {e}")
@@ -99,6 +163,10 @@ class WebSocketClient:
 
     async def close(self):
         """关闭 WebSocket 连接"""
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("WebSocket connection closed"))
+        self._pending.clear()
         if self.websocket:
             await self.websocket.close()
             self.is_connected = False
@@ -116,12 +184,22 @@ class WebSocketClient:
             except asyncio.CancelledError:
                 logger.info("Post task cancelled.")
 
-    async def post(self, action, params=None):
+    def _next_echo(self) -> str:
+        return f"pero-{next(self._echo_counter)}"
+
+    def _expect_response(self, echo: str) -> asyncio.Future:
+        """登记一个等待 echo 对应响应的 future"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending[echo] = future
+        return future
+
+    async def post(self, action, params=None, use_media_refs: bool = True):
         """发送 POST 请求
 
         Args:
             action (str): 请求的动作类型。
             params (dict, optional): 请求的参数。默认为 None。
+            use_media_refs (bool, optional): 是否复用已上传媒体的引用。默认为 True。
 
         Returns:
             None
@@ -131,14 +209,20 @@ class WebSocketClient:
             return
 
         try:
-            payload = {
-                "action": action.replace("/", ""),
-                "params": params,
-                "echo": int(datetime.datetime.now().timestamp()),
-            }
+            echo = self._next_echo()
+            action = action.replace("/", "")
+            # 本地媒体文件在发送前编码(线程池 + 缓存)或替换为已上传的引用
+            resolved, media_usage = await media_encoder.resolve(params, use_refs=use_media_refs)
+            payload = encode_frame(action, resolved, echo)
+
+            response = None
+            if action in SEND_MSG_ACTIONS:
+                response = self._expect_response(echo)
 
             logger.debug(f"Sent: {action=}, {payload=}")
             await self.send(payload)
+            if response is not None:
+                asyncio.create_task(self._track_sent(action, params, resolved, media_usage, echo, response))
             return
         except json.JSONDecodeError as e:
             logger.error(f"JSON encoding error: {e}")
@@ -147,13 +231,109 @@ class WebSocketClient:
             logger.error(f"Error sending message: {e}")
             raise e
 
+    async def call(self, action: str, params: Optional[Dict] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """发送请求并等待 NapCat 的响应
+
+        COALESCE_ACTIONS 中的查询在相同请求在途时不再重复发送，直接等待在途请求的响应。
+
+        Returns:
+            dict: NapCat 响应，包含 status、retcode、data 等字段
+        """
+        action = action.replace("/", "")
+        if action not in COALESCE_ACTIONS:
+            return await self._call(action, params, timeout)
+
+        key = (action, json.dumps(params, sort_keys=True, default=str))
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._call(action, params, timeout))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish_inflight(key, done))
+        else:
+            self.coalesced += 1
+        # 单个调用方被取消时不影响其他等待同一响应的调用方
+        return await asyncio.shield(future)
+
+    def _finish_inflight(self, key: Tuple[str, str], future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # 所有调用方都已取消时避免未读取异常的警告
+
+    async def _call(self, action: str, params: Optional[Dict], timeout: Optional[float]) -> Dict[str, Any]:
+        if not self.websocket:
+            raise ConnectionError("WebSocket not connected.")
+
+        echo = self._next_echo()
+        future = self._expect_response(echo)
+        try:
+            resolved, _ = await media_encoder.resolve(params)
+            await self.send(encode_frame(action, resolved, echo))
+            return await asyncio.wait_for(future, timeout=timeout or self.call_timeout)
+        finally:
+            self._pending.pop(echo, None)
+
+    async def _track_sent(
+        self, action: str, params: Dict, resolved: Dict, media_usage: MediaUsage, echo: str, response: asyncio.Future
+    ):
+        """根据发送结果记录发出的消息并维护媒体引用表
+
+        失败时用原始参数作废复用的引用并重发，成功时保存实际发送的消息(resolved)并记录新上传媒体的引用。
+        """
+        try:
+            result = await asyncio.wait_for(response, timeout=self.call_timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            return
+        finally:
+            self._pending.pop(echo, None)
+
+        try:
+            if result.get("status") == "failed" or result.get("retcode", 0) != 0:
+                if media_usage.reused:
+                    logger.warning(f"NapCat rejected media refs, resending file content: {result.get('wording')}")
+                    media_encoder.refs.invalidate(media_usage.reused)
+                    await media_encoder.save_refs()
+                    await self.post(action, params, use_media_refs=False)
+                return
+
+            message_id = (result.get("data") or {}).get("message_id")
+            if message_id is None:
+                return
+            await self._ensure_login_info()
+            message_store.add_sent(message_id, action, resolved)
+            if not media_usage.uploaded:
+                return
+            message = await self.call("get_msg", {"message_id": message_id})
+            media_encoder.refs.learn(media_usage.uploaded, (message.get("data") or {}).get("message") or [])
+            await media_encoder.save_refs()
+        except Exception as e:
+            logger.error(f"Error tracking sent message: {e}")
+
+    async def _ensure_login_info(self):
+        """首次发送消息后获取机器人自身信息，用于记录发出的消息"""
+        if self._login_info_requested:
+            return
+        self._login_info_requested = True
+        try:
+            info = (await self.call("get_login_info")).get("data") or {}
+            message_store.set_self(info.get("user_id"), info.get("nickname"))
+        except Exception as e:
+            logger.warning(f"Failed to get login info: {e}")
+
     async def _receive_messages(self):
         """不断接收 WebSocket 消息并放入 recv_queue"""
         while self.is_connected:
             try:
                 message = await self.receive()
-                if message:
-                    await recv_queue.put(message)
+                if not message:
+                    continue
+                # 有协程在等待的响应直接交给对应的 future
+                future = self._pending.get(message.get("echo")) if isinstance(message.get("echo"), str) else None
+                if future is not None:
+                    if not future.done():
+                        future.set_result(message)
+                    continue
+                await recv_queue.put(message)
             except Exception as e:
                 logger.error(f"Error receiving message: {e}")
 
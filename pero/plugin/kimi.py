@@ -1,25 +1,59 @@
-from openai import OpenAI
+import asyncio
 
 from pero.core.api import PERO_API as pero
+from pero.core.chat_history import ChatHistory
+from pero.core.debounce import Debouncer
+from pero.core.long_reply import SentenceBuffer, long_reply
 from pero.core.message_adapter import register
 from pero.core.message_parser import Message
 from pero.plugin.plugin_base import PluginBase
-from pero.plugin.plugin_manager import plugin, plugin_manager
+from pero.plugin.plugin_manager import plugin
 from pero.utils.config import config_manager
+from pero.utils.llm import ResponseCache, llm_pool
 from pero.utils.logger import logger
+from pero.utils.queue import post_queue
 
 
 class BaseChatPlugin(PluginBase):
+    # 流式生成时重发"正在输入"状态的间隔(秒)
+    typing_interval = 5.0
+    # 流式发送时每段的最少字数，避免一句一条刷屏
+    stream_min_chars = 10
+    # 历史摘要的最大字数
+    summary_chars = 300
+
     def __init__(self, model_name: str):
         self.config = config_manager
         self.model_name = model_name
+        self.client = None
+        self._model_config = None
+        self.history = ChatHistory(model_name, summarize=self._summarize)
+        self.response_cache = None
+        self.debouncer = Debouncer()
         self._update_config()
 
     def _update_config(self):
+        """配置变化时才重新获取客户端，客户端按 (base_url, api_key) 在插件间共享"""
         model_config = self.config.get("model", {}).get(self.model_name, {})
-        self.client = OpenAI(api_key=model_config["api_key"], base_url=model_config["base_url"])
+        if model_config == self._model_config and self.client is not None:
+            return
+        self._model_config = dict(model_config)
+        self.client = llm_pool.get(
+            model_config["base_url"], model_config["api_key"], max_concurrency=model_config.get("max_concurrency")
+        )
         self.system_content = model_config["system_content"]
         self.model = model_config["model"]
+        self.stream = model_config.get("stream", True)
+        # 历史的 token 预算，0 表示不带上下文
+        self.history.budget = model_config.get("history_tokens", 2000)
+        # 连续消息的合并窗口(秒)，0 表示逐条回复
+        self.debouncer.window = model_config.get("debounce", 1.0)
+        # 回复缓存需在配置中开启: response_cache: true 或 {ttl: 秒, max_entries: 条数}
+        cache_config = model_config.get("response_cache")
+        if cache_config:
+            self.response_cache = ResponseCache(**(cache_config if isinstance(cache_config, dict) else {}))
+        else:
+            self.response_cache = None
 
     def on_load(self):
         """插件加载时初始化OpenAI客户端"""
@@ -28,55 +62,149 @@ class BaseChatPlugin(PluginBase):
     def on_unload(self):
         """插件卸载时清理资源"""
         self.client = None
+        self._model_config = None
         logger.info(f"{self.__class__.__name__} plugin unloaded")
 
     async def chat(self, message: Message):
-        """处理群消息"""
+        """处理群聊和私聊消息"""
         try:
-            # 获取任务追踪器
-            task = plugin_manager.track_task(self.__class__.__name__)
-
-            try:
-                logger.info(f"收到消息: {message.content}")
-                if not message.content:
-                    return
-
-                # 获取文本内容
-                text = message.get_text()
+            logger.info(f"收到消息: {message.content}")
+            if not message.content:
+                return
 
-                # 调用API获取回复
-                result = await self._get_chat_response(text)
-                logger.info(f"回复消息: {result}")
+            # 获取文本内容
+            text = message.get_text()
 
-                # 发送群消息
-                return await pero.post_message(message=message, text=result)
-            finally:
-                # 标记任务完成
-                plugin_manager.complete_task(task)
+            # 合并同一用户短时间内连续发送的消息，只回复最后一条
+            if self.debouncer.window > 0:
+                return await self.debouncer.run(message.session_key, text, lambda merged: self._reply(message, merged))
+            return await self._reply(message, text)
 
         except Exception as e:
             logger.error(f"Error in {self.__class__.__name__} plugin: {e}")
             raise
 
-    async def _get_chat_response(self, text: str) -> str:
-        """调用ChatGPT API获取回复"""
-        self._update_config()  # 每次调用API之前更新配置
-        completion = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
+    async def _reply(self, message: Message, text: str):
+        """生成并发送回复"""
+        # 带上预算内的历史对话
+        messages = await self._build_messages(message, text)
+
+        # 相同上下文中的重复问题直接使用缓存的回复
+        cache_key = await self._cache_key(message, text)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            logger.info(f"回复消息(缓存): {cached}")
+            await self._remember(message, text, cached)
+            return await pero.post_message(message=message, text=cached)
+
+        if self.stream:
+            # 边生成边按句子发送
+            result = await self._stream_chat_response(message, messages)
+            logger.info(f"回复消息: {result}")
+            await self._remember(message, text, result, cache_key)
+            return None
+
+        # 调用API获取回复
+        result = await self._get_chat_response(messages)
+        logger.info(f"回复消息: {result}")
+        await self._remember(message, text, result, cache_key)
+
+        # 发送群消息
+        return await pero.post_message(message=message, text=result)
+
+    async def _build_messages(self, message: Message, text: str) -> list:
+        """组装请求消息"""
+        self._update_config()  # 每次调用API之前检查配置是否变化
+        if self.history.budget <= 0:
+            return [
                 {"role": "system", "content": self.system_content},
                 {"role": "user", "content": text},
+            ]
+        return await self.history.build_messages(message.session_key, self.system_content, text)
+
+    async def _cache_key(self, message: Message, text: str):
+        """回复缓存的键，未开启缓存时返回 None"""
+        if self.response_cache is None:
+            return None
+        digest = await self.history.digest(message.session_key) if self.history.budget > 0 else ""
+        return self.response_cache.key(self.model, self.system_content, text, digest)
+
+    async def _remember(self, message: Message, text: str, result: str, cache_key=None):
+        """记录本轮对话并缓存回复"""
+        if cache_key and self.response_cache is not None:
+            self.response_cache.set(cache_key, result)
+        if self.history.budget > 0 and result:
+            await self.history.append(message.session_key, text, result)
+
+    async def _summarize(self, summary: str, turns: list) -> str:
+        """在后台把旧对话合并进摘要"""
+        dialogue = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+        completion = await self.client.chat(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"把已有摘要和新的对话合并为一段不超过{self.summary_chars}字的摘要，"
+                    "保留用户的身份、偏好和未完成的问题，只输出摘要。",
+                },
+                {"role": "user", "content": f"已有摘要: {summary or '无'}\n\n新的对话:\n{dialogue}"},
             ],
             temperature=0.3,
         )
+        return completion.choices[0].message.content or summary
+
+    async def _get_chat_response(self, messages: list) -> str:
+        """调用ChatGPT API获取回复"""
+        completion = await self.client.chat(model=self.model, messages=messages, temperature=0.3)
         return completion.choices[0].message.content
 
+    async def _stream_chat_response(self, message: Message, messages: list) -> str:
+        """流式获取回复，每攒够一个句子就发送，返回完整回复"""
+        parts = []
+        buffer = SentenceBuffer(min_chars=self.stream_min_chars, max_chars=long_reply.max_chars)
+
+        async def segments():
+            async for delta in self.client.stream(model=self.model, messages=messages, temperature=0.3):
+                parts.append(delta)
+                for segment in buffer.feed(delta):
+                    yield segment
+            rest = buffer.flush()
+            if rest:
+                yield rest
+
+        async def build(segment: str, first: bool):
+            if first:
+                # 第一句发出后不再因同一会话的新消息而取消，避免合并后的回答重复已发送的内容
+                self.debouncer.commit(message.session_key)
+                return await pero.post_message(message=message, text=segment)
+            return await pero.post_msg(message.source, message.target, text=segment)
+
+        typing = asyncio.create_task(self._keep_typing(message))
+        try:
+            await long_reply.send_stream(segments(), build)
+        finally:
+            typing.cancel()
+        return "".join(parts)
+
+    async def _keep_typing(self, message: Message):
+        """生成期间定时发送"正在输入"状态，NapCat 只支持私聊"""
+        if message.source != "private":
+            return
+        while True:
+            await post_queue.put(await pero.set_input_status(1, message.user_id))
+            await asyncio.sleep(self.typing_interval)
+
 
 @plugin(name="kimi", version="1.0", dependencies=[])  # 如果有依赖其他插件，在这里添加
 class KimiChatPlugin(BaseChatPlugin):
     def __init__(self):
         super().__init__(model_name="kimi")
 
-    @register("group", ["text", "at"], "kimi")
+    @register("group", ["text", "at"], "kimi", excludes=[])
     async def chat(self, message: Message):
         return await super().chat(message)
+
+    @register("private", ["text"], "kimi")
+    async def private_chat(self, message: Message):
+        """私聊中的纯文本消息都视为对机器人说话，生成期间会显示正在输入状态"""
+        return await super().chat(message)
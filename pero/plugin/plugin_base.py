@@ -1,7 +1,7 @@
-import asyncio
 from datetime import timedelta
 
 from pero.core.api import PERO_API as pero
+from pero.core.scheduler import scheduler
 
 
 # 插件基类
@@ -35,51 +35,89 @@ class CommandBase(PluginBase):
 
 
 # 定时任务基类
-# TODO:依赖心跳包触发任务执行
 class ScheduleBase(PluginBase):
-    """定时任务基类，提供基本的生命周期方法和调度功能"""
+    """定时任务基类，提供基本的生命周期方法和调度功能
+
+    任务注册到中心调度器，由 set_interval 或 set_cron 设置触发方式；
+    jitter、overlap 和 missed 分别控制随机延迟、重叠运行策略和错过运行策略，见 pero.core.scheduler.Job
+    """
+
+    jitter: float = 0.0
+    overlap: str = "skip"
+    missed: str = "run_once"
 
     def __init__(self):
-        self._task = None
+        self._job = None
         self._interval = None
+        self._cron = None
+
+    @property
+    def job_name(self) -> str:
+        """调度任务名，也是持久化上次运行时间的键"""
+        return f"{type(self).__module__}.{type(self).__qualname__}"
 
     def set_interval(self, interval: timedelta):
         """设置任务执行间隔时间"""
         self._interval = interval
+        self._cron = None
+
+    def set_cron(self, expr: str):
+        """设置 cron 表达式(分 时 日 月 周)，如 "0 9 * * *" 表示每天 9 点"""
+        self._cron = expr
+        self._interval = None
 
     async def _run(self):
         """任务运行的内部方法"""
-        while True:
-            try:
-                await self.execute()
-            except Exception as e:
-                self.on_error(e)
-            await asyncio.sleep(self._interval.total_seconds())
+        try:
+            await self.execute()
+        except Exception as e:
+            self.on_error(e)
+
+    def _schedule(self):
+        if self._interval or self._cron:
+            self._job = scheduler.add_job(
+                self.job_name,
+                self._run,
+                interval=self._interval,
+                cron=self._cron,
+                jitter=self.jitter,
+                overlap=self.overlap,
+                missed=self.missed,
+            )
+
+    def _unschedule(self):
+        if self._job:
+            # 热重载时新实例已用同名任务替换了旧任务，不能将其移除
+            if scheduler.jobs.get(self._job.name) is self._job:
+                scheduler.remove_job(self._job.name, cancel=True)
+            self._job = None
+
+    def ensure_scheduled(self):
+        """调度任务被同名任务替换或移除后重新注册，例如热重载失败回滚时"""
+        if self._job and scheduler.jobs.get(self._job.name) is not self._job:
+            self._job = None
+            self._schedule()
 
     def on_load(self):
         """插件加载时调用"""
         super().on_load()
-        if self._interval:
-            self._task = asyncio.create_task(self._run())
+        self._schedule()
 
     def on_unload(self):
         """插件卸载时调用"""
         super().on_unload()
-        if self._task:
-            self._task.cancel()
+        self._unschedule()
 
     def on_enable(self):
         """插件启用时调用"""
         super().on_enable()
-        if self._interval and not self._task:
-            self._task = asyncio.create_task(self._run())
+        if not self._job:
+            self._schedule()
 
     def on_disable(self):
         """插件禁用时调用"""
         super().on_disable()
-        if self._task:
-            self._task.cancel()
-            self._task = None
+        self._unschedule()
 
     async def execute(self):
         """执行任务的方法，子类需要实现此方法"""
@@ -8,13 +8,17 @@ import sys
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set
 
-from pero.plugin.plugin_base import PluginBase
+from pero.plugin.plugin_base import PluginBase, ScheduleBase
 from pero.utils.hybrid_lock import HybridLock
 from pero.utils.logger import logger
 
+# 当前正在执行的处理器所属插件，处理器创建的后台任务据此登记到对应插件
+current_plugin: ContextVar[Optional[str]] = ContextVar("current_plugin", default=None)
+
 
 @dataclass
 class PluginMeta:
@@ -33,15 +37,35 @@ class PluginTask:
     def __init__(self, plugin_name: str):
         self.plugin_name = plugin_name
         self.start_time = time.time()
-        self.completed = threading.Event()
+        self.completed = asyncio.Event()
 
     def mark_completed(self):
         self.completed.set()
 
 
+@dataclass
+class ReloadStats:
+    """单个模块的热重载统计"""
+
+    reloads: int = 0
+    failures: int = 0
+    last_time: float = 0.0
+    max_time: float = 0.0
+    last_drain_time: float = 0.0
+
+    def record(self, elapsed: float, drain_time: float):
+        self.reloads += 1
+        self.last_time = elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.last_drain_time = drain_time
+
+
 class PluginManager:
     """插件管理器 - 使用单例模式"""
 
+    reload_debounce = 0.5  # 合并同一文件连续的修改事件(秒)
+    drain_timeout = 30.0  # 热重载时等待旧版本任务结束的最长时间(秒)
+
     _instance: Optional["PluginManager"] = None
     _lock = threading.Lock()
 
@@ -65,6 +89,10 @@ class PluginManager:
         self._executor = ThreadPoolExecutor()
         self._plugin_dirs: List[str] = []  # 插件目录列表
         self._file_observers: List[object] = []  # 文件监控器列表
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 主事件循环，热重载在其中执行
+        self._reload_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._reload_tasks: Set[asyncio.Task] = set()
+        self._reload_stats: Dict[str, ReloadStats] = {}
 
         self._initialized = True
 
@@ -88,6 +116,15 @@ class PluginManager:
         with self._tasks_lock:
             self._active_tasks.remove(task)
 
+    def track_background(self, task: asyncio.Task) -> Optional[PluginTask]:
+        """把处理器创建的后台任务登记为当前插件的进行中任务，热重载会等待它结束"""
+        plugin_name = current_plugin.get()
+        if plugin_name is None:
+            return None
+        tracked = self.track_task(plugin_name)
+        task.add_done_callback(lambda _: self.complete_task(tracked))
+        return tracked
+
     def _resolve_dependencies(self) -> List[str]:
         """解析插件依赖关系,返回正确的加载顺序"""
         visited = set()
@@ -142,16 +179,22 @@ class PluginManager:
             except Exception as e:
                 logger.error(f"Error discovering plugin {name}: {e}")
 
-    async def _wait_plugin_tasks(self, plugin_name: str):
-        """等待指定插件的所有任务完成"""
-        while True:
-            async with self._tasks_lock:
-                active_tasks = {task for task in self._active_tasks if task.plugin_name == plugin_name}
-                if not active_tasks:
-                    break
-            # 等待所有任务的完成事件
-            for task in active_tasks:
-                await asyncio.wrap_future(self._executor.submit(task.completed.wait))
+    async def _wait_plugin_tasks(self, plugin_names: Optional[Set[str]] = None, timeout: Optional[float] = None) -> int:
+        """等待指定插件(默认全部)当前正在执行的任务完成，之后开始的任务不在等待范围内
+
+        返回超时后仍未完成的任务数
+        """
+        with self._tasks_lock:
+            active_tasks = [
+                task for task in self._active_tasks if plugin_names is None or task.plugin_name in plugin_names
+            ]
+        if not active_tasks:
+            return 0
+        waiters = [asyncio.ensure_future(task.completed.wait()) for task in active_tasks]
+        _, pending = await asyncio.wait(waiters, timeout=timeout)
+        for waiter in pending:
+            waiter.cancel()
+        return len(pending)
 
     def register_plugin(self, meta: PluginMeta):
         """注册插件元数据"""
@@ -172,16 +215,19 @@ class PluginManager:
                 observer.join()
             self._file_observers.clear()
 
+            # 取消尚未开始的热重载
+            for handle in self._reload_timers.values():
+                handle.cancel()
+            self._reload_timers.clear()
+            if self._reload_tasks:
+                await asyncio.gather(*self._reload_tasks, return_exceptions=True)
+
             # 等待所有活跃任务完成
-            async with self._tasks_lock:
-                active_tasks = list(self._active_tasks)
-                if active_tasks:
-                    logger.info(f"Waiting for {len(active_tasks)} active tasks to complete...")
-                    for task in active_tasks:
-                        await asyncio.wait_for(
-                            asyncio.wrap_future(self._executor.submit(task.completed.wait)),
-                            timeout=5.0,
-                        )
+            if self._active_tasks:
+                logger.info(f"Waiting for {len(self._active_tasks)} active tasks to complete...")
+                pending = await self._wait_plugin_tasks(timeout=5.0)
+                if pending:
+                    logger.warning(f"{pending} plugin tasks still running after 5s")
 
             # 卸载所有插件
             for plugin_name, plugin in list(self._plugins.items()):
@@ -206,18 +252,32 @@ class PluginManager:
             raise
 
     def watch_plugin_dirs(self):
-        """监控插件目录变化"""
+        """监控插件目录变化，需要在主事件循环中调用"""
+        self._loop = asyncio.get_running_loop()
 
         def watch_directory():
             import watchdog.events
             import watchdog.observers
 
+            loop = self._loop
+
             class PluginHandler(watchdog.events.FileSystemEventHandler):
+                def _changed(self, path: str):
+                    if path.endswith(".py"):
+                        logger.info(f"Detected changes in {path}")
+                        module_name = os.path.splitext(os.path.basename(path))[0]
+                        # watchdog 回调在监控线程中执行，重载交给主事件循环
+                        loop.call_soon_threadsafe(plugin_manager.schedule_reload, module_name)
+
                 def on_modified(self, event):
-                    if event.src_path.endswith(".py"):
-                        logger.info(f"Detected changes in {event.src_path}")
-                        module_name = os.path.splitext(os.path.basename(event.src_path))[0]
-                        plugin_manager._reload_module(module_name)
+                    self._changed(event.src_path)
+
+                def on_created(self, event):
+                    self._changed(event.src_path)
+
+                def on_moved(self, event):
+                    # 编辑器常用写临时文件再重命名的方式保存
+                    self._changed(event.dest_path)
 
             observer = watchdog.observers.Observer()
             for plugin_dir in self._plugin_dirs:
@@ -228,19 +288,100 @@ class PluginManager:
 
         self._executor.submit(watch_directory)
 
-    def _reload_module(self, module_name: str):
-        """重新加载模块及其包含的插件"""
-        try:
-            module = importlib.import_module(module_name)
-            importlib.reload(module)
+    def schedule_reload(self, module_name: str):
+        """延迟重载模块，窗口内同一模块的多次修改只触发一次重载"""
+        handle = self._reload_timers.pop(module_name, None)
+        if handle is not None:
+            handle.cancel()
+        loop = self._loop or asyncio.get_running_loop()
+        self._reload_timers[module_name] = loop.call_later(self.reload_debounce, self._start_reload, module_name)
+
+    def _start_reload(self, module_name: str):
+        self._reload_timers.pop(module_name, None)
+        task = asyncio.create_task(self.reload_module(module_name))
+        self._reload_tasks.add(task)
+        task.add_done_callback(self._reload_tasks.discard)
+
+    def _module_plugins(self, module_name: str) -> Set[str]:
+        """模块中已加载的插件名"""
+        return {
+            name
+            for name in self._plugins
+            if name in self._plugin_meta and self._plugin_meta[name].module_path == module_name
+        }
+
+    async def reload_module(self, module_name: str) -> bool:
+        """热重载模块中的插件
+
+        新模块的处理器和插件实例在路由表之外构建，成功后一次性切换，失败时保留旧版本；
+        切换后新消息只进入新版本，再等待旧版本正在执行的任务结束后卸载旧实例。
+        """
+        # message_adapter 依赖本模块，在这里导入避免循环引用
+        from pero.core.message_adapter import MessageAdapter
 
-            # 重新加载模块中的所有插件
-            for item_name, item in inspect.getmembers(module):
-                if inspect.isclass(item) and hasattr(item, "_is_plugin") and item._meta.name in self._plugins:
-                    asyncio.run(self.reload_plugin(item._meta.name))
+        async with self._reload_lock:
+            module = sys.modules.get(module_name)
+            old_names = self._module_plugins(module_name)
+            if module is None or not old_names:
+                logger.debug(f"Module {module_name} has no loaded plugins, skip reloading")
+                return False
+
+            stats = self._reload_stats.setdefault(module_name, ReloadStats())
+            start = time.perf_counter()
+            new_instances: Dict[str, Any] = {}
+            try:
+                with MessageAdapter.staging() as staged:
+                    module = importlib.reload(module)
+                for _, item in inspect.getmembers(module, inspect.isclass):
+                    if hasattr(item, "_is_plugin") and item.__module__ == module_name:
+                        new_instances[item._meta.name] = item()
+                for instance in new_instances.values():
+                    instance.on_load()
+            except Exception as e:
+                stats.failures += 1
+                for instance in new_instances.values():
+                    try:
+                        instance.on_unload()
+                    except Exception:
+                        pass
+                # 新实例的 on_load 可能已经用同名任务替换了旧实例的定时任务，回滚时恢复
+                for name in old_names:
+                    instance = self._plugins.get(name)
+                    if isinstance(instance, ScheduleBase):
+                        instance.ensure_scheduled()
+                logger.error(f"Failed to reload module {module_name}, keeping the old version: {e}")
+                return False
+
+            # 切换插件实例和路由表，中间没有 await，消息分发不会看到中间状态
+            old_instances = {name: self._plugins.pop(name) for name in old_names}
+            for name, instance in new_instances.items():
+                self._plugin_meta[name] = type(instance)._meta
+                self._plugins[name] = instance
+            MessageAdapter.swap_plugins(old_names | set(new_instances), staged)
+            swapped = time.perf_counter()
+
+            # 等待旧版本正在执行的任务结束
+            pending = await self._wait_plugin_tasks(old_names, timeout=self.drain_timeout)
+            if pending:
+                logger.warning(f"{pending} tasks of {module_name} still running after {self.drain_timeout}s")
+            drained = time.perf_counter()
+
+            for name, instance in old_instances.items():
+                try:
+                    instance.on_unload()
+                except Exception as e:
+                    logger.error(f"Error unloading old plugin {name}: {e}")
 
-        except Exception as e:
-            logger.error(f"Error reloading module {module_name}: {e}")
+            elapsed = time.perf_counter() - start
+            stats.record(elapsed, drained - swapped)
+            logger.info(
+                f"Reloaded plugins {sorted(new_instances)} from {module_name} in {elapsed * 1000:.1f}ms "
+                f"(swap {(swapped - start) * 1000:.1f}ms, drain {(drained - swapped) * 1000:.1f}ms)"
+            )
+            return True
+
+    def reload_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: vars(stats).copy() for name, stats in self._reload_stats.items()}
 
     def _load_plugin(self, plugin_name: str):
         """加载单个插件"""
@@ -269,20 +410,9 @@ class PluginManager:
             except Exception as e:
                 logger.error(f"Failed to load plugin {plugin_name}: {e}")
 
-    async def reload_plugin(self, plugin_name: str):
-        """热重载插件"""
-        async with self._reload_lock:
-            # 等待该插件的所有任务完成
-            await self._wait_plugin_tasks(plugin_name)
-
-            # 调用插件的清理方法
-            old_instance = self._plugins.get(plugin_name)
-            if old_instance and hasattr(old_instance, "on_unload"):
-                old_instance.on_unload()
-
-            # 重新加载插件
-            importlib.reload(importlib.import_module(self._plugin_meta[plugin_name].module_path))
-            self._load_plugin(plugin_name)
+    async def reload_plugin(self, plugin_name: str) -> bool:
+        """热重载插件所在的模块"""
+        return await self.reload_module(self._plugin_meta[plugin_name].module_path)
 
 
 # 插件装饰器
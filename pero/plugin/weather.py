@@ -1,15 +1,17 @@
 import asyncio
+import json
+import os
 import traceback
 from typing import Dict, Optional, Tuple
 from urllib.parse import quote
 
-import aiohttp
-
 from pero.core.message_adapter import register
 from pero.core.message_parser import Message
 from pero.plugin.plugin_base import CommandBase
 from pero.plugin.plugin_manager import plugin
+from pero.utils.cache import LRUCache
 from pero.utils.config import config_manager as config
+from pero.utils.http import http_client
 from pero.utils.logger import logger
 
 WEATHER_KEY = config.WEATHER_KEY
@@ -17,28 +19,51 @@ LOCATION_KEY = config.LOCATION_KEY
 
 
 class WeatherService:
-    def __init__(self):
-        self._session: Optional[aiohttp.ClientSession] = None
-
-    async def __aenter__(self):
-        self._session = aiohttp.ClientSession()
-        return self
-
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self._session:
-            await self._session.close()
+    """天气查询
+
+    城市经纬度不会变化，缓存在 JSON 文件中并在插件加载时读入；
+    天气按保留两位小数的经纬度短时间缓存，同一地点的并发查询只请求一次。
+    """
+
+    def __init__(self, geocode_path: str = "data/geocode.json", weather_ttl: float = 120.0):
+        self.geocode_path = geocode_path
+        self.locations: Dict[str, Tuple[float, float]] = {}
+        self._weather = LRUCache(max_entries=1024, ttl=weather_ttl)
+        self._inflight: Dict[Tuple[float, float], asyncio.Future] = {}
+        # 多个城市并发查询时保存依次进行，避免同时写同一个临时文件
+        self._save_lock = asyncio.Lock()
+
+    def load(self):
+        """读入经纬度缓存"""
+        if not os.path.exists(self.geocode_path):
+            return
+        try:
+            with open(self.geocode_path, "r", encoding="utf-8") as f:
+                self.locations = {city: tuple(location) for city, location in json.load(f).items()}
+            logger.info(f"Loaded {len(self.locations)} cached city locations")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to load geocode cache {self.geocode_path}: {e}")
+
+    def _save(self, locations: Dict[str, Tuple[float, float]]):
+        directory = os.path.dirname(self.geocode_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.geocode_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(locations, f, ensure_ascii=False)
+        os.replace(tmp_path, self.geocode_path)
 
     async def fetch_json(self, url: str) -> Dict:
         """通用的异步 GET 请求函数，返回 JSON 数据"""
-        if not self._session:
-            raise RuntimeError("Session not initialized. Use 'async with' context manager.")
-        async with self._session.get(url) as response:
-            return await response.json()
+        return await http_client.get_json(url)
 
     async def get_location(self, city: str) -> Tuple[Optional[float], Optional[float]]:
-        """调用腾讯地图接口，根据城市获取经纬度"""
-        city = quote(city)
-        url = f"https://apis.map.qq.com/ws/geocoder/v1/?address={city}&key={LOCATION_KEY}"
+        """根据城市获取经纬度，未缓存时调用腾讯地图接口"""
+        city = city.strip()
+        if city in self.locations:
+            return self.locations[city]
+
+        url = f"https://apis.map.qq.com/ws/geocoder/v1/?address={quote(city)}&key={LOCATION_KEY}"
 
         data = await self.fetch_json(url)
         if data.get("status") != 0:
@@ -46,16 +71,42 @@ class WeatherService:
             return None, None
 
         location = data.get("result", {}).get("location", {})
-        return location.get("lat"), location.get("lng")
+        lat, lon = location.get("lat"), location.get("lng")
+        if lat is not None and lon is not None:
+            self.locations[city] = (lat, lon)
+            try:
+                async with self._save_lock:
+                    await asyncio.get_running_loop().run_in_executor(None, self._save, dict(self.locations))
+            except OSError as e:
+                logger.warning(f"Failed to save geocode cache: {e}")
+        return lat, lon
 
     async def get_weather(self, lat: float, lon: float) -> str:
-        """调用天气接口，根据经纬度获取天气信息"""
+        """根据经纬度获取天气信息"""
+        key = (round(lat, 2), round(lon, 2))
+        report = self._weather.get(key)
+        if report is not None:
+            return report
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_weather(*key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        report = await asyncio.shield(future)
+        if report is None:
+            return "无法获取天气信息, 可能是网络异常, 请重试"
+        self._weather.set(key, report)
+        return report
+
+    async def _fetch_weather(self, lat: float, lon: float) -> Optional[str]:
+        """调用天气接口，根据经纬度获取天气信息，失败时返回 None"""
         url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={WEATHER_KEY}&lang=zh_cn"
 
         data = await self.fetch_json(url)
-        if not data:
-            logger.error("获取天气信息失败")
-            return "无法获取天气信息, 可能是网络异常, 请重试"
+        if not data or "main" not in data:
+            logger.error(f"获取天气信息失败: {data}")
+            return None
 
         location = data.get("name", "未知地点")
         weather = data.get("weather", [{}])[0].get("description", "未知天气")
@@ -79,6 +130,13 @@ class WeatherService:
 
 @plugin(name="weather", version="1.0", dependencies=[])
 class Forecast(CommandBase):
+    service = WeatherService(**(config.get("weather", {}) or {}))
+
+    def on_load(self):
+        """插件加载时读入经纬度缓存"""
+        super().on_load()
+        self.service.load()
+
     @register("group", ["cmd", "weather"], "weather")
     async def execute(self, message: Message) -> str:
         results = await self.search(message=message)
@@ -103,10 +161,9 @@ class Forecast(CommandBase):
 
     async def get_forecast(self, city: str) -> str:
         """根据城市名称获取天气信息"""
-        async with WeatherService() as service:
-            lat, lon = await service.get_location(city)
+        lat, lon = await self.service.get_location(city)
 
-            if lat is None or lon is None:
-                return f"无法获取城市 {city} 的经纬度信息，请检查输入是否正确。"
+        if lat is None or lon is None:
+            return f"无法获取城市 {city} 的经纬度信息，请检查输入是否正确。"
 
-            return await service.get_weather(lat, lon)
+        return await self.service.get_weather(lat, lon)
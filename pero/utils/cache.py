@@ -0,0 +1,126 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+    expires_at: Optional[float]
+
+
+class LRUCache:
+    """带 TTL、条目数和字节数上限的 LRU 缓存(非线程安全，供事件循环内使用)"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof or (lambda value: 1)
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        """获取缓存值，命中时刷新其 LRU 位置"""
+        entry = self._data.get(key)
+        if entry is None:
+            if count:
+                self.misses += 1
+            return default
+        if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            if count:
+                self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, size: Optional[int] = None):
+        """写入缓存，超出上限时淘汰最久未使用的条目"""
+        if key in self._data:
+            self._remove(key)
+        size = self._sizeof(value) if size is None else size
+        if self.max_bytes is not None and size > self.max_bytes:
+            # 单个条目超过总容量，不缓存
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = CacheEntry(value, size, expires_at)
+        self.total_bytes += size
+        self._shrink()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._remove(key)
+        return default if entry is None else entry.value
+
+    def clear(self):
+        self._data.clear()
+        self.total_bytes = 0
+
+    def purge_expired(self) -> int:
+        """清理所有已过期的条目，返回清理数量"""
+        now = time.monotonic()
+        expired = [key for key, entry in self._data.items() if entry.expires_at is not None and entry.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+        return entry
+
+    def _shrink(self):
+        while self._data and (
+            len(self._data) > self.max_entries or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            key, entry = self._data.popitem(last=False)
+            self.total_bytes -= entry.size
+            self.evictions += 1
+            if self._on_evict:
+                self._on_evict(key, entry.value)
@@ -0,0 +1,117 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from pero.utils.config import config_manager
+from pero.utils.logger import logger
+
+
+class HostStats:
+    """单个主机的请求统计"""
+
+    __slots__ = ("requests", "errors", "total_time", "max_time")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, error: bool):
+        self.requests += 1
+        self.errors += error
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_time": self.total_time / self.requests if self.requests else 0.0,
+            "max_time": self.max_time,
+        }
+
+
+class HttpClient:
+    """插件共用的 HTTP 客户端
+
+    所有请求共享一个 aiohttp 会话: keep-alive 连接池、按主机的连接数上限、DNS 缓存和统一超时，
+    并按主机记录请求数、错误数和耗时。会话在首次请求时创建，应用关闭时统一关闭。
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        timeout: float = 15.0,
+        connect_timeout: float = 5.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.hosts: Dict[str, HostStats] = {}
+
+    @classmethod
+    def from_config(cls) -> "HttpClient":
+        return cls(**(config_manager.get("http", {}) or {}))
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """共享的 aiohttp 会话，需要流式读取等高级用法时直接使用"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+        """发送请求并记录统计，用法: async with http_client.request("GET", url) as response: ..."""
+        stats = self.hosts.setdefault(urlsplit(url).netloc, HostStats())
+        start = time.monotonic()
+        error = True
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                yield response
+                error = response.status >= 400
+        finally:
+            stats.record(time.monotonic() - start, error)
+
+    async def get_json(self, url: str, **kwargs: Any) -> Any:
+        """GET 请求并解析 JSON"""
+        async with self.request("GET", url, **kwargs) as response:
+            return await response.json(content_type=None)
+
+    async def post_json(self, url: str, json: Any = None, **kwargs: Any) -> Any:
+        """POST JSON 并解析返回的 JSON"""
+        async with self.request("POST", url, json=json, **kwargs) as response:
+            return await response.json(content_type=None)
+
+    async def get_text(self, url: str, **kwargs: Any) -> str:
+        async with self.request("GET", url, **kwargs) as response:
+            return await response.text()
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: stats.to_dict() for host, stats in self.hosts.items()}
+
+    async def close(self):
+        """关闭会话和连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP client closed.")
+        self._session = None
+
+
+http_client = HttpClient.from_config()
@@ -1,29 +1,32 @@
 import base64
 import mimetypes
 import os
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 
 
-def trans_file(file_path):
+def guess_mime_type(file_path) -> str:
     # 获取文件的 MIME 类型
     mime_type, _ = mimetypes.guess_type(file_path)
 
     if mime_type is None:
         raise ValueError("Unable to guess MIME type for the file.")
+    return mime_type
 
-    # 打开文件并读取为二进制数据
-    with open(file_path, "rb") as file:
-        file_data = file.read()
 
-        # 将二进制数据编码为 Base64
-        encoded_data = base64.b64encode(file_data)
+def to_data_uri(file_data: bytes, mime_type: str) -> str:
+    """将二进制数据编码为 data URI"""
+    base64_str = base64.b64encode(file_data).decode("utf-8")
+    return f"data:{mime_type};base64,{base64_str}"
 
-        # 将 Base64 编码的数据转换为字符串
-        base64_str = encoded_data.decode("utf-8")
 
-        # 构造 data URI
-        data_uri = f"data:{mime_type};base64,{base64_str}"
+def trans_file(file_path):
+    mime_type = guess_mime_type(file_path)
 
-        return data_uri
+    # 打开文件并读取为二进制数据
+    with open(file_path, "rb") as file:
+        return to_data_uri(file.read(), mime_type)
 
 
 def read_file(file_path) -> any:
@@ -31,13 +34,29 @@ def read_file(file_path) -> any:
         return f.read()
 
 
+def local_file_uri(file_path) -> str:
+    """本地文件路径转换为 file:// URI"""
+    return Path(file_path).resolve().as_uri()
+
+
+def local_path_from_uri(uri: str):
+    """从 file:// URI 中解析本地路径，文件不存在时返回 None"""
+    if not uri.startswith("file://"):
+        return None
+    path = url2pathname(urlparse(uri).path)
+    return path if os.path.isfile(path) else None
+
+
 def convert_uploadable_object(i, message_type):
-    """将可上传对象转换为标准格式"""
+    """将可上传对象转换为标准格式
+
+    本地文件只记录 file:// 引用，由发送端(WebSocketClient)在事件循环外完成编码
+    """
     if i.startswith("http"):
         return {"type": message_type, "data": {"file": i}}
     elif i.startswith("base64://"):
         return {"type": message_type, "data": {"file": i}}
     elif os.path.exists(i):
-        return {"type": message_type, "data": {"file": f"{trans_file(i)}"}}
+        return {"type": message_type, "data": {"file": local_file_uri(i)}}
     else:
         return {"type": message_type, "data": {"file": f"file:///{i}"}}
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+import re
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from pero.utils.cache import LRUCache
+from pero.utils.config import config_manager
+from pero.utils.logger import logger
+
+
+class PooledClient:
+    """共享的 AsyncOpenAI 客户端，请求数受所属服务商的并发上限约束"""
+
+    def __init__(self, client: AsyncOpenAI, limiter: asyncio.Semaphore):
+        self.client = client
+        self.limiter = limiter
+
+    async def chat(self, **kwargs: Any):
+        """调用 chat.completions.create，返回完整的 completion"""
+        async with self.limiter:
+            return await self.client.chat.completions.create(**kwargs)
+
+    async def stream(self, **kwargs: Any) -> AsyncIterator[str]:
+        """流式调用 chat.completions.create，逐个产出文本增量，整个生成过程占用一个并发名额"""
+        async with self.limiter:
+            stream = await self.client.chat.completions.create(stream=True, **kwargs)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+
+class LLMClientPool:
+    """按 (base_url, api_key) 复用 OpenAI 兼容客户端
+
+    同一服务商的请求共享 keep-alive 连接池和并发上限，客户端只在首次使用时创建。
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        max_concurrency: int = 8,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._clients: Dict[Tuple[str, str], PooledClient] = {}
+        self._limiters: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def from_config(cls) -> "LLMClientPool":
+        return cls(**(config_manager.get("llm_pool", {}) or {}))
+
+    def get(self, base_url: str, api_key: str, max_concurrency: Optional[int] = None) -> PooledClient:
+        """获取 (base_url, api_key) 对应的客户端，不存在时创建"""
+        key = (base_url, api_key)
+        pooled = self._clients.get(key)
+        if pooled is None:
+            limiter = self._limiters.get(base_url)
+            if limiter is None:
+                limiter = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+                self._limiters[base_url] = limiter
+            http_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            pooled = PooledClient(client, limiter)
+            self._clients[key] = pooled
+            logger.info(f"Created LLM client for {base_url}")
+        return pooled
+
+    async def close(self):
+        """关闭所有客户端的连接池"""
+        clients, self._clients = self._clients, {}
+        for pooled in clients.values():
+            try:
+                await pooled.client.close()
+            except Exception as e:
+                logger.warning(f"Error closing LLM client: {e}")
+        self._limiters.clear()
+
+
+class ResponseCache:
+    """LLM 回复缓存
+
+    键为 (模型, 系统提示哈希, 规范化后的用户输入, 历史摘要哈希)，
+    同一问题在相同上下文中重复出现时直接返回缓存的回复。
+    """
+
+    _SPACES = re.compile(r"\s+")
+    _TRAILING = re.compile(r"[\s。．.！!？?~～…]+$")
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 512):
+        self._cache = LRUCache(max_entries=max_entries, ttl=ttl)
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        """忽略大小写、多余空白和句末标点"""
+        return cls._TRAILING.sub("", cls._SPACES.sub(" ", text.strip()).lower())
+
+    def key(self, model: str, system: str, text: str, history_digest: str = "") -> str:
+        system_hash = hashlib.blake2b(system.encode("utf-8"), digest_size=16).hexdigest()
+        raw = json.dumps([model, system_hash, self.normalize(text), history_digest], ensure_ascii=False)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def set(self, key: str, reply: str):
+        if reply:
+            self._cache.set(key, reply)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+llm_pool = LLMClientPool.from_config()
@@ -0,0 +1,466 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from pero.utils.cache import LRUCache
+from pero.utils.config import config_manager
+from pero.utils.io import (
+    guess_mime_type,
+    local_file_uri,
+    local_path_from_uri,
+    to_data_uri,
+)
+from pero.utils.logger import logger
+
+# 需要上传文件内容的消息段类型
+MEDIA_TYPES = {"image", "file", "record", "video"}
+
+# 媒体发送模式: base64 内联，或 path 引用共享目录中的文件
+MODE_BASE64 = "base64"
+MODE_PATH = "path"
+MODE_AUTO = "auto"
+
+_LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1", "0.0.0.0"}
+
+
+def is_local_endpoint(uri: str) -> bool:
+    """判断 NapCat 连接地址是否在本机"""
+    host = urlparse(uri).hostname or ""
+    if host in _LOCAL_HOSTS:
+        return True
+    try:
+        return host in {socket.gethostname(), socket.getfqdn()}
+    except OSError:
+        return False
+
+
+FileSignature = Tuple[str, int, int]
+
+
+@dataclass
+class MediaUsage:
+    """一次发送中用到的本地媒体: 新上传的 (类型, 哈希)、复用引用的哈希和共享目录中的文件名"""
+
+    uploaded: List[Tuple[str, str]] = field(default_factory=list)
+    reused: List[str] = field(default_factory=list)
+    spooled: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.uploaded or self.reused)
+
+
+class MediaRefMap:
+    """内容哈希 -> NapCat 返回的媒体引用(URL)，持久化为 JSON 文件"""
+
+    def __init__(self, path: Optional[str], max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._refs: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+
+        # 统计信息
+        self.hits = 0
+        self.learned = 0
+        self.invalidated = 0
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._refs = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Failed to load media refs from {path}: {e}")
+
+    def get(self, digest: str) -> Optional[str]:
+        entry = self._refs.get(digest)
+        if entry is None:
+            return None
+        self.hits += 1
+        return entry["ref"]
+
+    def learn(self, uploaded: List[Tuple[str, str]], segments: List[Dict[str, Any]]):
+        """按顺序将发送出的媒体与 get_msg 返回的消息段对应，记录其 URL"""
+        returned: Dict[str, List[Dict[str, Any]]] = {}
+        for segment in segments:
+            if isinstance(segment, dict) and segment.get("type") in MEDIA_TYPES:
+                returned.setdefault(segment["type"], []).append(segment.get("data") or {})
+        for segment_type, digest in uploaded:
+            candidates = returned.get(segment_type)
+            if not candidates:
+                continue
+            ref = candidates.pop(0).get("url")
+            if isinstance(ref, str) and ref.startswith("http"):
+                self._refs.pop(digest, None)
+                self._refs[digest] = {"type": segment_type, "ref": ref, "created": time.time()}
+                self.learned += 1
+                self._dirty = True
+        while len(self._refs) > self.max_entries:
+            del self._refs[next(iter(self._refs))]
+
+    def invalidate(self, digests: List[str]):
+        for digest in digests:
+            if self._refs.pop(digest, None) is not None:
+                self.invalidated += 1
+                self._dirty = True
+
+    def snapshot(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """取出待保存的数据，没有变更时返回 None"""
+        if not self.path or not self._dirty:
+            return None
+        self._dirty = False
+        return dict(self._refs)
+
+    def write(self, refs: Dict[str, Dict[str, Any]]):
+        """写入 JSON 文件(原子替换)"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(refs, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save media refs to {self.path}: {e}")
+
+    def save(self):
+        refs = self.snapshot()
+        if refs is not None:
+            self.write(refs)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._refs),
+            "hits": self.hits,
+            "learned": self.learned,
+            "invalidated": self.invalidated,
+        }
+
+
+class MediaEncoder:
+    """本地媒体文件编码器
+
+    文件读取、哈希和 base64 编码都在线程池中完成，编码结果按内容哈希缓存在内存 LRU 中
+    (可选磁盘层)，同一张图片重复发送时无需重新编码。
+
+    path 模式下(NapCat 与 pero 共享文件系统)不再内联 base64，而是将文件复制到共享目录，
+    以内容哈希命名，只发送 file:// 引用；目录中的文件按最后使用时间回收。
+    """
+
+    def __init__(
+        self,
+        cache_bytes: int = 64 * 1024 * 1024,
+        disk_cache_dir: Optional[str] = None,
+        workers: int = 2,
+        mode: str = MODE_AUTO,
+        spool_dir: str = "data/media_spool",
+        spool_max_age: float = 24 * 3600,
+        refs_path: Optional[str] = "data/media_refs.json",
+    ):
+        self.disk_cache_dir = disk_cache_dir
+        self.mode = mode
+        self.active_mode = MODE_BASE64 if mode == MODE_AUTO else mode
+        self.spool_dir = os.path.abspath(spool_dir)
+        self.spool_max_age = spool_max_age
+        self._spool_used: Dict[str, float] = {}  # 共享目录文件名 -> 最后使用时间
+        self._spool_pinned: Set[str] = set()  # 长期引用(如消息模板)的文件，不回收
+        self._last_gc = time.monotonic()
+        self._gc_task: Optional[asyncio.Task] = None
+        self._cache = LRUCache(max_entries=4096, max_bytes=cache_bytes, sizeof=len)
+        # (路径, 大小, 修改时间) -> 内容哈希，避免每次读取文件计算哈希
+        self._digests = LRUCache(max_entries=4096)
+        self._inflight: Dict[FileSignature, asyncio.Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media")
+        self.refs = MediaRefMap(refs_path)
+        if disk_cache_dir:
+            os.makedirs(disk_cache_dir, exist_ok=True)
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.encodes = 0
+        self.disk_hits = 0
+        self.encode_time = 0.0
+        self.spooled = 0
+        self.spool_removed = 0
+
+    @classmethod
+    def from_config(cls) -> "MediaEncoder":
+        settings = config_manager.get("media", {}) or {}
+        return cls(
+            cache_bytes=settings.get("cache_bytes", 64 * 1024 * 1024),
+            disk_cache_dir=settings.get("disk_cache_dir"),
+            workers=settings.get("workers", 2),
+            mode=settings.get("mode", MODE_AUTO),
+            spool_dir=settings.get("spool_dir", "data/media_spool"),
+            spool_max_age=settings.get("spool_max_age", 24 * 3600),
+            refs_path=settings.get("refs_path", "data/media_refs.json"),
+        )
+
+    def configure_transport(self, uri: str):
+        """根据 NapCat 连接地址选择媒体发送模式"""
+        if self.mode == MODE_AUTO:
+            self.active_mode = MODE_PATH if is_local_endpoint(uri) else MODE_BASE64
+        else:
+            self.active_mode = self.mode
+        logger.info(f"Media transport mode: {self.active_mode} ({uri})")
+
+    async def encode(self, path: str) -> str:
+        """返回本地文件的 data URI"""
+        mime_type = guess_mime_type(path)
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(signature, count=False)
+        if digest is not None:
+            cached = self._cache.get((digest, mime_type))
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+
+        # 同一文件的并发编码只执行一次
+        future = self._inflight.get(signature)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[signature] = future
+        try:
+            start_time = time.perf_counter()
+            digest, encoded, from_disk = await loop.run_in_executor(
+                self._executor, self._encode_file, path, mime_type, signature
+            )
+            self.encode_time += time.perf_counter() - start_time
+            if from_disk:
+                self.disk_hits += 1
+            else:
+                self.encodes += 1
+            self._digests.set(signature, digest)
+            self._cache.set((digest, mime_type), encoded)
+            future.set_result(encoded)
+            return encoded
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现 "exception was never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(signature, None)
+
+    async def resolve(self, params: Any, use_refs: bool = True) -> Tuple[Any, "MediaUsage"]:
+        """将消息参数中指向本地文件的 file:// 引用替换为可发送的内容
+
+        优先使用已上传过的 NapCat 引用，其次按当前模式内联 base64 或引用共享目录。
+        不修改传入的对象，有替换时返回新的参数字典，同时返回本次用到的媒体记录。
+        """
+        usage = MediaUsage()
+        if not isinstance(params, dict) or not isinstance(params.get("message"), list):
+            return params, usage
+        message = await self._resolve_segments(params["message"], usage, use_refs)
+        if message is params["message"]:
+            return params, usage
+        return {**params, "message": message}, usage
+
+    async def _resolve_segments(self, segments: list, usage: "MediaUsage", use_refs: bool) -> list:
+        resolved = list(segments)
+        changed = False
+        for i, segment in enumerate(segments):
+            new_segment = await self._resolve_segment(segment, usage, use_refs)
+            if new_segment is not segment:
+                resolved[i] = new_segment
+                changed = True
+        return resolved if changed else segments
+
+    async def _resolve_segment(self, segment: Any, usage: "MediaUsage", use_refs: bool) -> Any:
+        try:
+            segment_type = segment["type"]
+            data = segment["data"]
+        except (KeyError, TypeError):
+            return segment
+        if segment_type == "node" and isinstance(data.get("content"), list):
+            content = await self._resolve_segments(data["content"], usage, use_refs)
+            if content is data["content"]:
+                return segment
+            return {"type": segment_type, "data": {**data, "content": content}}
+        if segment_type not in MEDIA_TYPES:
+            return segment
+        file = data.get("file")
+        path = local_path_from_uri(file) if isinstance(file, str) else None
+        if path is None:
+            return segment
+
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(signature, count=False)
+        if use_refs and digest is not None:
+            ref = self.refs.get(digest)
+            if ref is not None:
+                usage.reused.append(digest)
+                return {"type": segment_type, "data": {**data, "file": ref}}
+
+        if self.active_mode == MODE_PATH:
+            file = await self.spool(path)
+            usage.spooled.append(os.path.basename(local_path_from_uri(file) or file))
+        else:
+            file = await self.encode(path)
+        digest = self._digests.get(signature, count=False)
+        if digest is not None:
+            # 首次计算出哈希时(如重启后)也可以直接使用持久化的引用
+            ref = self.refs.get(digest) if use_refs else None
+            if ref is not None:
+                usage.reused.append(digest)
+                file = ref
+            else:
+                usage.uploaded.append((segment_type, digest))
+        return {"type": segment_type, "data": {**data, "file": file}}
+
+    async def spool(self, path: str) -> str:
+        """将文件放入共享目录(按内容哈希去重)，返回其 file:// 引用"""
+        loop = asyncio.get_running_loop()
+        stat = os.stat(path)
+        signature = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(signature, count=False)
+        name = f"{digest}{os.path.splitext(path)[1]}" if digest else None
+        if name is None or name not in self._spool_used:
+            digest, name = await loop.run_in_executor(self._executor, self._spool_file, path, digest)
+            self._digests.set(signature, digest)
+            self.spooled += 1
+        else:
+            self.hits += 1
+        self._spool_used[name] = time.time()
+
+        if time.monotonic() - self._last_gc > min(self.spool_max_age, 600):
+            self._last_gc = time.monotonic()
+            if self._gc_task is None or self._gc_task.done():
+                self._gc_task = asyncio.create_task(self._gc_spool())
+        return local_file_uri(os.path.join(self.spool_dir, name))
+
+    def pin(self, names: List[str]):
+        """固定共享目录中的文件，不再按最后使用时间回收"""
+        self._spool_pinned.update(names)
+
+    def _spool_file(self, path: str, digest: Optional[str]) -> Tuple[str, str]:
+        """在线程池中将文件复制到共享目录
+
+        不使用硬链接: 硬链接与源文件共享 inode，源文件被原地修改时按内容哈希命名的副本也会随之改变。
+        """
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+        name = f"{digest}{os.path.splitext(path)[1]}"
+        target = os.path.join(self.spool_dir, name)
+        if not os.path.exists(target):
+            os.makedirs(self.spool_dir, exist_ok=True)
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, target)
+        return digest, name
+
+    async def _gc_spool(self):
+        """删除共享目录中超过 spool_max_age 未使用的文件
+
+        目录扫描在线程池中完成，删除和 _spool_used 的更新在事件循环中进行，
+        删除前再次检查最后使用时间，扫描期间重新被使用的文件不会被删除。
+        """
+        cutoff = time.time() - self.spool_max_age
+        loop = asyncio.get_running_loop()
+        stale = await loop.run_in_executor(self._executor, self._scan_spool, dict(self._spool_used), cutoff)
+        for name in stale:
+            if name in self._spool_pinned or self._spool_used.get(name, 0.0) >= cutoff:
+                continue
+            try:
+                os.unlink(os.path.join(self.spool_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to remove spooled media {name}: {e}")
+                continue
+            self._spool_used.pop(name, None)
+            self.spool_removed += 1
+
+    def _scan_spool(self, used: Dict[str, float], cutoff: float) -> List[str]:
+        """在线程池中找出超过期限未使用的文件"""
+        try:
+            entries = list(os.scandir(self.spool_dir))
+        except FileNotFoundError:
+            return []
+        stale = []
+        for entry in entries:
+            try:
+                if max(used.get(entry.name, 0.0), entry.stat().st_mtime) < cutoff:
+                    stale.append(entry.name)
+            except OSError:
+                continue
+        return stale
+
+    def _encode_file(self, path: str, mime_type: str, signature: FileSignature) -> Tuple[str, str, bool]:
+        """在线程池中读取、哈希并编码文件，返回 (哈希, data URI, 是否命中磁盘缓存)
+
+        磁盘层以 (路径, 大小, 修改时间) 为键，命中时不再读取源文件；
+        文件第一行是内容哈希，其余是 base64 内容，MIME 类型由调用方决定。
+        """
+        disk_path = None
+        if self.disk_cache_dir:
+            key = hashlib.sha256(repr(signature).encode("utf-8")).hexdigest()
+            disk_path = os.path.join(self.disk_cache_dir, f"{key}.b64")
+            try:
+                with open(disk_path, "r", encoding="ascii") as f:
+                    digest = f.readline().strip()
+                    return digest, f"data:{mime_type};base64,{f.read()}", True
+            except FileNotFoundError:
+                pass
+
+        with open(path, "rb") as f:
+            file_data = f.read()
+        digest = hashlib.sha256(file_data).hexdigest()
+        encoded = to_data_uri(file_data, mime_type)
+        if disk_path:
+            try:
+                tmp_path = f"{disk_path}.tmp"
+                with open(tmp_path, "w", encoding="ascii") as f:
+                    f.write(f"{digest}\n")
+                    f.write(encoded.split(",", 1)[1])
+                os.replace(tmp_path, disk_path)
+            except OSError as e:
+                logger.warning(f"Failed to write media disk cache: {e}")
+        return digest, encoded, False
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "memory": self._cache.stats(),
+            "encodes": self.encodes,
+            "disk_hits": self.disk_hits,
+            "encode_time": round(self.encode_time, 3),
+            "mode": self.active_mode,
+            "spooled": self.spooled,
+            "spool_removed": self.spool_removed,
+            "refs": self.refs.stats(),
+        }
+
+    async def save_refs(self):
+        """在线程池中保存媒体引用表"""
+        refs = self.refs.snapshot()
+        if refs is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.refs.write, refs)
+
+    def close(self):
+        self.refs.save()
+        self._executor.shutdown(wait=False)
+
+
+media_encoder = MediaEncoder.from_config()
@@ -0,0 +1,20 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """按固定速率放行请求(每秒 rate 次)，多个协程共享同一个时间线"""
+
+    def __init__(self, rate: Optional[float] = None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_time = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        wait = self._next_time - now
+        self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
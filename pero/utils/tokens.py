@@ -0,0 +1,21 @@
+import re
+from typing import Dict, Iterable
+
+# 中日韩字符大约一个字一个 token，其余文本大约四个字符一个 token
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯　-〿]")
+
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """本地快速估算文本的 token 数，不依赖分词器"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_messages_tokens(messages: Iterable[Dict[str, str]]) -> int:
+    """估算 chat 消息列表的 token 数"""
+    return sum(estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD for message in messages)
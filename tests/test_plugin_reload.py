@@ -0,0 +1,65 @@
+import asyncio
+import sys
+
+import pero.plugin.plugin_base as plugin_base
+from pero.core.scheduler import Scheduler
+from pero.plugin.plugin_manager import plugin_manager
+
+PLUGIN_SOURCE = """
+from datetime import timedelta
+
+from pero.plugin.plugin_base import ScheduleBase
+from pero.plugin.plugin_manager import plugin
+
+FAIL = {fail}
+
+
+@plugin(name="reload_tick", version="1.0")
+class ReloadTick(ScheduleBase):
+    def __init__(self):
+        super().__init__()
+        self.set_interval(timedelta(seconds=60))
+
+    def on_load(self):
+        super().on_load()
+        if FAIL:
+            raise RuntimeError("broken on_load")
+
+    async def execute(self):
+        pass
+"""
+
+
+def live_entries(scheduler: Scheduler, name: str) -> int:
+    """堆中仍会触发 name 任务的条目数"""
+    job = scheduler.jobs.get(name)
+    return sum(1 for _, _, version, entry in scheduler._heap if entry == name and job and job.version == version)
+
+
+def test_failed_reload_keeps_one_live_entry(tmp_path, monkeypatch):
+    scheduler = Scheduler(str(tmp_path / "scheduler.json"))
+    monkeypatch.setattr(plugin_base, "scheduler", scheduler)
+    # 插件管理器是单例，测试结束后恢复它的状态
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.setattr(plugin_manager, "_plugin_dirs", [])
+    monkeypatch.setattr(plugin_manager, "_plugins", {})
+    monkeypatch.setattr(plugin_manager, "_plugin_meta", {})
+    plugin_file = tmp_path / "reload_tick.py"
+    plugin_file.write_text(PLUGIN_SOURCE.format(fail=False), encoding="utf-8")
+
+    async def main():
+        plugin_manager.add_plugin_dir(str(tmp_path))
+        plugin_manager.discover_plugins()
+        plugin_manager.load_plugins()
+        old = plugin_manager.get_plugin("reload_tick")
+        assert live_entries(scheduler, old.job_name) == 1
+
+        plugin_file.write_text(PLUGIN_SOURCE.format(fail=True), encoding="utf-8")
+        assert not await plugin_manager.reload_module("reload_tick")
+
+        assert plugin_manager.get_plugin("reload_tick") is old
+        assert scheduler.jobs[old.job_name] is old._job
+        assert live_entries(scheduler, old.job_name) == 1
+        await scheduler.close()
+
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+import asyncio
+
+from pero.core.scheduler import Scheduler
+
+
+def live_entries(scheduler: Scheduler, name: str) -> int:
+    """堆中仍会触发 name 任务的条目数"""
+    job = scheduler.jobs.get(name)
+    return sum(1 for _, _, version, entry in scheduler._heap if entry == name and job and job.version == version)
+
+
+async def noop():
+    pass
+
+
+def test_replace_keeps_one_live_entry(tmp_path):
+    scheduler = Scheduler(str(tmp_path / "scheduler.json"))
+    scheduler.add_job("job", noop, interval=60)
+    scheduler.add_job("job", noop, interval=60)
+    assert live_entries(scheduler, "job") == 1
+
+
+def test_remove_then_add_keeps_one_live_entry(tmp_path):
+    scheduler = Scheduler(str(tmp_path / "scheduler.json"))
+    scheduler.add_job("job", noop, interval=60)
+    scheduler.remove_job("job")
+    assert live_entries(scheduler, "job") == 0
+    scheduler.add_job("job", noop, interval=60)
+    assert live_entries(scheduler, "job") == 1
+
+
+def test_remove_then_add_fires_once(tmp_path):
+    runs = []
+
+    async def job():
+        runs.append(1)
+
+    async def main():
+        scheduler = Scheduler(str(tmp_path / "scheduler.json"))
+        scheduler.add_job("job", job, interval=60, overlap="allow")
+        scheduler.remove_job("job")
+        scheduler.add_job("job", job, interval=60, overlap="allow")
+        await asyncio.sleep(0.05)
+        await scheduler.close()
+
+    asyncio.run(main())
+    assert runs == [1]